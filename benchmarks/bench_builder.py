@@ -0,0 +1,74 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Micro-benchmark of the tags construction on a large builder-style page."""
+
+import timeit
+
+from lxml import etree
+
+from nagare.renderers import xml
+
+NB_ROWS = 1000
+NB_COLUMNS = 5
+
+
+class ObjectifyTag(xml.Tag):
+    """Children added through an ``objectify`` dummy element."""
+
+    def add_children(self, children, attrib=None):
+        if not children and not attrib:
+            return
+
+        dummy = self._dummy_maker.dummy(attrib or {}, *xml.flatten(children, self.renderer))
+
+        if dummy.text:
+            if len(self):
+                self[-1].tail = (self[-1].tail or '') + dummy.text
+            else:
+                self.text = (self.text or '') + dummy.text
+
+        self.attrib.update(dummy.attrib)
+        self.extend(dummy.iterchildren())
+
+        self.on_change()
+
+
+class ObjectifyRenderer(xml.Renderer):
+    _parser = etree.XMLParser()
+    _parser.set_element_class_lookup(etree.ElementDefaultClassLookup(element=ObjectifyTag))
+
+
+def with_page(x):
+    with x.table(border=0):
+        for i in range(NB_ROWS):
+            with x.tr({'class': 'odd' if i % 2 else 'even'}):
+                for j in range(NB_COLUMNS):
+                    x << x.td('cell ', i, '-', j, id='cell%d' % j)
+
+    return x.root
+
+
+def functional_page(x):
+    return x.table([x.tr([x.td('cell ', i, '-', j) for j in range(NB_COLUMNS)], id=i) for i in range(NB_ROWS)])
+
+
+def main(number=5):
+    nb_tags = NB_ROWS * (NB_COLUMNS + 1) + 1
+
+    for page in (with_page, functional_page):
+        for renderer in (ObjectifyRenderer, xml.Renderer):
+            assert page(renderer()).tostring() == page(xml.Renderer()).tostring()
+
+            duration = min(timeit.repeat(lambda: page(renderer()), number=number, repeat=10)) / number / nb_tags
+            print('%-16s %-18s %6.2f us / tag' % (page.__name__, renderer.__name__, duration * 1e6))
+
+
+if __name__ == '__main__':
+    main()
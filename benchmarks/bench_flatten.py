@@ -0,0 +1,79 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Throughput of ``flatten()`` on million-item children, compared to the former recursive version."""
+
+import sys
+import time
+
+from nagare.renderers import xml
+
+NB = 1000000
+
+
+def recursive_flatten(l, renderer):  # noqa: E741
+    for e in l:
+        if isinstance(e, xml.Renderable):
+            e = e.render(renderer)
+
+        if xml.is_iterable(e):
+            yield from recursive_flatten(e, renderer)
+        else:
+            yield e
+
+
+class Component(xml.Renderable):
+    def render(self, renderer):
+        return ['a', 'b']
+
+
+def main():
+    x = xml.Renderer()
+    tag = x.td
+
+    workloads = (
+        ('flat strings', lambda: ['text'] * NB),
+        ('flat tags', lambda: [tag] * NB),
+        ('flat mixed', lambda: ['text', 42, None, tag] * (NB // 4)),
+        ('lists of 10', lambda: [['text'] * 10] * (NB // 10)),
+        ('nested depth 4', lambda: [[[['text'] * 10] * 10] * 10] * (NB // 1000)),
+        ('generators', lambda: (str(i) for i in range(NB))),
+        ('renderables', lambda: [Component()] * (NB // 2)),
+    )
+
+    for name, children in workloads:
+        durations = []
+        for flatten in (recursive_flatten, xml.flatten):
+            timings = []
+            for _ in range(3):
+                l = children()  # noqa: E741
+                start = time.perf_counter()
+                list(flatten(l, x))
+                timings.append(time.perf_counter() - start)
+
+            durations.append(min(timings))
+
+        print(
+            '%-15s recursive %8.1f ms iterative %8.1f ms (x%.1f)'
+            % (name, durations[0] * 1e3, durations[1] * 1e3, durations[0] / durations[1])
+        )
+
+    children = 'leaf'
+    for _ in range(sys.getrecursionlimit() * 2):
+        children = [children]
+
+    try:
+        list(recursive_flatten(children, x))
+    except RecursionError:
+        print('recursive: RecursionError at depth %d' % (sys.getrecursionlimit() * 2))
+    print('iterative: %s' % list(xml.flatten(children, x)))
+
+
+if __name__ == '__main__':
+    main()
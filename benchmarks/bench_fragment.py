@@ -0,0 +1,67 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Peak memory and duration of the parsing of multi-megabytes fragments.
+
+Compare the former parsing, concatenating the whole source into a dummy
+root, to the current incremental feeding of the parser.
+"""
+
+import os
+import time
+import tempfile
+import tracemalloc
+from io import BytesIO as BufferIO
+
+from lxml import etree
+
+from nagare.renderers import xml
+
+
+def concatenate(x, source):
+    parser = x._get_parser(xml.Tag, 'utf-8')
+    with open(source, 'rb') as f:
+        data = BufferIO(b'<html><body>%s</body></html>' % f.read())
+
+    return etree.parse(data, parser).getroot()[0]
+
+
+def feed(x, source):
+    return x._parse(open(source, 'rb'), xml.Tag, True, 'utf-8')  # noqa: SIM115
+
+
+def measure(parse, x, source):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse(x, source)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak, duration
+
+
+def main():
+    x = xml.Renderer()
+
+    for size in (1, 8, 32):
+        with tempfile.NamedTemporaryFile('wb', suffix='.xml', delete=False) as f:
+            item = b'<li class="item">%s</li>' % (b'x' * 100)
+            f.write(b'leading text' + item * (size * 1024 * 1024 // len(item)))
+
+        try:
+            for name, parse in (('concatenation', concatenate), ('feed', feed)):
+                peak, duration = measure(parse, x, f.name)
+                print('%3d MB %-15s peak %8.1f MB %8.1f ms' % (size, name, peak / 1024 / 1024, duration * 1000))
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Cost of the ids generation, compared to the former ``random.randint()`` generation."""
+
+import random
+import timeit
+
+from nagare.renderers import xml
+
+NB = 100000
+
+
+def randint_id(prefix=''):
+    return prefix + str(random.randint(10000000, 99999999))
+
+
+def main():
+    x = xml.Renderer()
+    deterministic = xml.Renderer(id_generator=xml.DeterministicIdGenerator())
+
+    for name, generate_id in (
+        ('random.randint', randint_id),
+        ('IdGenerator', x.generate_id),
+        ('DeterministicIdGenerator', deterministic.generate_id),
+    ):
+        duration = min(timeit.repeat(lambda: generate_id('id'), number=NB, repeat=5))
+        print('%-25s %6.0f ns / id' % (name, duration / NB * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Micro-benchmark of the ``meld:id`` lookups on a template with hundreds of melds."""
+
+import timeit
+
+from nagare.renderers import xml
+
+NB_MELDS = 500
+
+
+def template(nb_melds=NB_MELDS):
+    melds = ''.join('<li meld:id="item%d">item</li>' % i for i in range(nb_melds))
+    return '<ul xmlns:meld="%s">%s</ul>' % (xml.MELD_NS, melds)
+
+
+def findmeld_interpolated(root, id):
+    """The lookup without the compiled XPath expression."""
+    nodes = root.xpath('.//*[@meld:id="%s"]' % id, namespaces={'meld': xml.MELD_NS})
+    return nodes[0] if len(nodes) != 0 else None
+
+
+def main(number=5):
+    root = xml.Renderer().fromstring(template())
+    indexed_root = xml.Renderer().fromstring(template()).index_melds()
+    ids = ['item%d' % i for i in range(NB_MELDS)]
+
+    benchs = (
+        ('interpolated xpath', lambda: [findmeld_interpolated(root, id) for id in ids]),
+        ('compiled xpath', lambda: [root.findmeld(id) for id in ids]),
+        ('meld index', lambda: [indexed_root.findmeld(id) for id in ids]),
+    )
+
+    for name, bench in benchs:
+        duration = min(timeit.repeat(bench, number=number, repeat=5)) / number / NB_MELDS
+        print('%-20s %8.2f us / findmeld' % (name, duration * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Micro-benchmark of ``Tag.repeat()`` on a large table."""
+
+import timeit
+
+from nagare.renderers import xml
+
+NB_ROWS = 10000
+
+TEMPLATE = """
+<table xmlns:meld="http://www.plope.com/software/meld3">
+  <tr meld:id="row"><td meld:id="name">name</td><td meld:id="value">value</td><td>-</td></tr>
+</table>
+"""
+
+
+def repeat(rows):
+    root = xml.Renderer().fromstring(TEMPLATE)
+
+    for clone, i in root.repeat(rows, 'row'):
+        clone[0].text = str(i)
+
+    return root
+
+
+def main(number=3):
+    benchs = (
+        ('sequence', lambda: repeat(range(NB_ROWS))),
+        ('generator', lambda: repeat(i for i in range(NB_ROWS))),
+    )
+
+    for name, bench in benchs:
+        duration = min(timeit.repeat(bench, number=number, repeat=10)) / number / NB_ROWS
+        print('%-10s %6.2f us / row' % (name, duration * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Elements created by second on a tag-heavy page, by ``TagProp`` renderers, with and without namespaces."""
+
+import timeit
+
+from nagare.renderers import xml
+
+NB_ROWS = 500
+NB_COLUMNS = 10
+
+
+class TagPropRenderer(xml.XmlRenderer):
+    table = xml.TagProp('table')
+    tr = xml.TagProp('tr')
+    td = xml.TagProp('td')
+    span = xml.TagProp('span')
+
+
+class FormerTagPropRenderer(TagPropRenderer):
+    """The elements always created by the parser then called."""
+
+    def makeelement(self, tag, *args, **kw):
+        element = xml.local_parser(self._parser).makeelement(self._prefix + tag, nsmap=self.namespaces)
+        element.init(self)
+
+        return element(*args, **kw)
+
+
+def page(x):
+    with x.table:
+        for i in range(NB_ROWS):
+            with x.tr:
+                for j in range(NB_COLUMNS):
+                    with x.td:
+                        x << x.span
+
+    return x.root
+
+
+def main():
+    nb_elements = 1 + NB_ROWS * (1 + NB_COLUMNS * 2)
+
+    for namespaces in (None, {'meld': xml.MELD_NS, 'x': 'http://www.w3.org/1999/xhtml'}):
+        for renderer in (FormerTagPropRenderer, TagPropRenderer):
+
+            def render(renderer=renderer, namespaces=namespaces):
+                x = renderer()
+                x.namespaces = namespaces
+                return page(x)
+
+            duration = min(timeit.repeat(render, number=3, repeat=5)) / 3
+            print(
+                '%-22s namespaces=%-5s %10.0f elements / s'
+                % (renderer.__name__, bool(namespaces), nb_elements / duration)
+            )
+
+
+if __name__ == '__main__':
+    main()
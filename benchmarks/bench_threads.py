@@ -0,0 +1,89 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Multi-threaded stress benchmark: pages rendered by second for 1 to N threads.
+
+The throughput only scales with the number of threads on a free-threaded
+CPython build.
+"""
+
+import os
+import sys
+import time
+import threading
+
+from nagare.renderers import xml
+
+NB_PAGES = 200
+
+TEMPLATE = """
+<html xmlns:meld="http://www.plope.com/software/meld3">
+  <head><title meld:id="title">title</title></head>
+  <body><ul><li meld:id="item">item</li></ul></body>
+</html>
+"""
+
+
+def render():
+    x = xml.Renderer()
+
+    page = x.fromstring(TEMPLATE)
+    page.findmeld('title').text = 'Page'
+    for li, i in page.repeat(range(20), 'item'):
+        li.text = str(i)
+
+    with x.table:
+        for i in range(20):
+            with x.tr:
+                x << x.td(i) << x.td('cell', id=x.generate_id('cell'))
+
+    page[1](x.root)
+
+    return page.tostring(pipeline=False)
+
+
+def worker(nb_pages, errors):
+    try:
+        for _ in range(nb_pages):
+            render()
+    except Exception as e:  # noqa: BLE001
+        errors.append(e)
+
+
+def run(nb_threads):
+    errors = []
+    threads = [threading.Thread(target=worker, args=(NB_PAGES, errors)) for _ in range(nb_threads)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    return nb_threads * NB_PAGES / duration
+
+
+def main(max_threads=None):
+    max_threads = max_threads or os.cpu_count() or 1
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+
+    print('GIL %s' % ('enabled' if gil else 'disabled'))
+
+    nb_threads = 1
+    while nb_threads <= max_threads:
+        print('%3d threads %8.1f pages / s' % (nb_threads, run(nb_threads)))
+        nb_threads *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
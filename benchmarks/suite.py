@@ -0,0 +1,324 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Benchmark suite of the builder, meld, parse and serialize paths.
+
+Usage:
+  python benchmarks/suite.py run [-k FILTER] [-o RESULTS.json]
+  python benchmarks/suite.py compare BASELINE.json [RESULTS.json] [-t THRESHOLD]
+
+``run`` times each workload and can save the results. ``compare`` runs the
+suite (or loads saved results) and reports the workloads slower than the
+baseline by more than the threshold, exiting with a non-zero status if any.
+
+The timings depend on the machine: a baseline must be produced on the same
+machine as the results it is compared to.
+"""
+
+import io
+import sys
+import json
+import timeit
+import argparse
+import platform
+
+from lxml import etree
+
+from nagare.renderers import xml
+
+BENCHMARKS = {}
+
+
+def benchmark(f):
+    """Register a workload.
+
+    A workload is a function preparing the data, then returning the function to time.
+    """
+    BENCHMARKS[f.__name__] = f
+    return f
+
+
+# Builder
+# -------
+
+
+@benchmark
+def builder_with_table():
+    """Large table built with ``with`` blocks."""
+
+    def render():
+        x = xml.Renderer()
+        with x.table(border=0):
+            for i in range(500):
+                with x.tr({'class': 'odd' if i % 2 else 'even'}):
+                    for j in range(10):
+                        x << x.td('cell ', i, '-', j, id='cell%d' % j)
+
+        return x.root
+
+    return render
+
+
+@benchmark
+def builder_functional_table():
+    """Large table built by nested ``Tag.__call__``."""
+
+    def render():
+        x = xml.Renderer()
+        return x.table([x.tr([x.td('cell ', i, '-', j) for j in range(10)], id=i) for i in range(500)])
+
+    return render
+
+
+@benchmark
+def flatten_nested():
+    """Nested lists, tuples and ranges of children."""
+    children = [[i, ('a', 'b', range(5)), [[None, 1.5]]] for i in range(1000)]
+
+    return lambda: list(xml.flatten(children, None))
+
+
+# Meld
+# ----
+
+
+def meld_template(nb_melds):
+    melds = ''.join('<li meld:id="item%d"><span meld:id="label">item</span></li>' % i for i in range(nb_melds))
+    return '<ul xmlns:meld="%s">%s</ul>' % (xml.MELD_NS, melds)
+
+
+@benchmark
+def meld_findmeld():
+    """``findmeld()`` of each of the 500 ids of a template."""
+    root = xml.Renderer().fromstring(meld_template(500))
+    ids = ['item%d' % i for i in range(500)]
+
+    return lambda: [root.findmeld(id) for id in ids]
+
+
+@benchmark
+def meld_repeat():
+    """``repeat()`` of a meld 1000 times, filling the clones."""
+    template = meld_template(1)
+
+    def render():
+        root = xml.Renderer().fromstring(template)
+        for li, i in root.repeat(range(1000), 'item0'):
+            li.findmeld('label').fill(str(i))
+
+        return root
+
+    return render
+
+
+# Parse
+# -----
+
+
+@benchmark
+def parse_fromstring():
+    """Parsing of a 500 melds template, without the templates cache."""
+    template = meld_template(500)
+
+    x = xml.Renderer()
+    x.templates_cache = None
+
+    return lambda: x.fromstring(template)
+
+
+@benchmark
+def parse_fromstring_cached():
+    """Copy of a 500 melds template from the templates cache."""
+    template = meld_template(500)
+
+    x = xml.Renderer()
+    x.templates_cache = xml.LRUCache()
+
+    return lambda: x.fromstring(template)
+
+
+@benchmark
+def parse_fragment():
+    """Parsing of a 200 KB fragment, without the templates cache."""
+    fragment = 'leading text' + '<li class="item">item</li>text' * 7000
+
+    x = xml.Renderer()
+    x.templates_cache = None
+
+    return lambda: x.fromstring(fragment, fragment=True)
+
+
+# Serialize
+# ---------
+
+
+@benchmark
+def serialize_tostring():
+    """Serialization of a 5000 cells table."""
+    x = xml.Renderer()
+    root = x.table([x.tr([x.td('cell ', i, '-', j) for j in range(10)], id=i) for i in range(500)])
+
+    return root.tostring
+
+
+@benchmark
+def serialize_iter_tostring():
+    """Streamed serialization of a 5000 cells table."""
+    x = xml.Renderer()
+    root = x.table([x.tr([x.td('cell ', i, '-', j) for j in range(10)], id=i) for i in range(500)])
+
+    return lambda: b''.join(root.iter_tostring())
+
+
+@benchmark
+def namespaces_document():
+    """Document mixing 4 namespaces, built then serialized."""
+    namespaces = {'a': 'http://example.com/a', 'b': 'http://example.com/b', 'c': 'http://example.com/c'}
+    nsmap = dict(namespaces, meld=xml.MELD_NS)
+
+    def render():
+        x = xml.Renderer()
+        x.namespaces = nsmap
+        x.default_namespace = 'a'
+
+        with x.document:
+            for i in range(300):
+                x.default_namespace = 'b'
+                with x.item(id=i):
+                    x.default_namespace = 'c'
+                    x << x.value(str(i)).meld_id('value')
+                    x.default_namespace = 'a'
+                    x << x.label('label')
+
+        return x.root.tostring(pipeline=False)
+
+    return render
+
+
+# ---------------------------------------------------------------------------
+
+
+def run(pattern=None, repeat=7, min_time=0.2, out=sys.stdout):
+    """Time the workloads.
+
+    In:
+      - ``pattern`` -- only run the workloads with this pattern into their name
+      - ``repeat`` -- number of timings, the best one is kept
+      - ``min_time`` -- minimal duration of each timing, in seconds
+
+    Return:
+      - dictionary of the durations, in seconds, of one execution of each workload
+    """
+    results = {}
+
+    for name, workload in BENCHMARKS.items():
+        if pattern and (pattern not in name):
+            continue
+
+        timer = timeit.Timer(workload())
+        number, duration = timer.autorange()
+        number = max(1, int(number * min_time / duration)) if duration else number
+
+        duration = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = duration
+        print('%-28s %10.1f us' % (name, duration * 1e6), file=out)
+
+    return results
+
+
+def metadata():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'lxml': '.'.join(map(str, etree.LXML_VERSION)),
+        'machine': platform.machine(),
+    }
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save(filename, results):
+    with open(filename, 'w') as f:
+        json.dump({'metadata': metadata(), 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(baseline, results, threshold, out=sys.stdout):
+    """Report the workloads slower than the baseline.
+
+    In:
+      - ``baseline`` -- dictionary of the reference durations
+      - ``results`` -- dictionary of the new durations
+      - ``threshold`` -- tolerated slowdown ratio (0.1 = 10%)
+
+    Return:
+      - the names of the regressed workloads
+    """
+    regressions = []
+
+    for name, duration in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            print('%-28s %10.1f us  (new)' % (name, duration * 1e6), file=out)
+            continue
+
+        ratio = duration / reference - 1
+        status = ''
+        if ratio > threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+
+        print(
+            '%-28s %10.1f us %10.1f us %+7.1f%%  %s' % (name, reference * 1e6, duration * 1e6, ratio * 100, status),
+            file=out,
+        )
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite of the XML renderer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_command = commands.add_parser('run', help='time the workloads')
+    run_command.add_argument('-k', dest='pattern', help='only run the workloads with this pattern into their name')
+    run_command.add_argument('-o', dest='output', help='save the results into this JSON file')
+
+    compare_command = commands.add_parser('compare', help='compare against a baseline')
+    compare_command.add_argument('baseline', help='JSON file of the baseline')
+    compare_command.add_argument('results', nargs='?', help='JSON file of the results, else the suite is run')
+    compare_command.add_argument('-k', dest='pattern', help='only run the workloads with this pattern into their name')
+    compare_command.add_argument('-t', dest='threshold', type=float, default=0.1, help='tolerated slowdown ratio')
+
+    args = parser.parse_args(args)
+
+    if args.command == 'run':
+        results = run(args.pattern)
+        if args.output:
+            save(args.output, results)
+
+        return 0
+
+    baseline = load(args.baseline)
+    if baseline['metadata'] != metadata():
+        print('Warning: baseline produced on a different environment %s' % baseline['metadata'])
+
+    results = load(args.results)['results'] if args.results else run(args.pattern, out=io.StringIO())
+    regressions = compare(baseline['results'], results, args.threshold)
+    if regressions:
+        print('%d regression(s) beyond %d%%' % (len(regressions), args.threshold * 100))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
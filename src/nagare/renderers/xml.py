@@ -9,24 +9,608 @@
 
 """XML renderer."""
 
+import os
 import copy
+import math
+import time
 import random
+import asyncio
+import hashlib
+import inspect
+import marshal
+import weakref
+import operator
+import tempfile
+import threading
+import contextlib
+import contextvars
 from io import BytesIO as BufferIO
-from urllib.request import urlopen
-from collections.abc import Iterable
+from itertools import chain, count, islice
+from collections import OrderedDict
+from urllib.error import URLError, HTTPError
+from urllib.request import Request, urlopen
+from collections.abc import Iterable, AsyncIterable
 
 from lxml import etree, objectify
 
+# Read when the ``TagProp`` are created and each time the tags are changed:
+# set it once, before the renderers classes are defined
 CHECK_ATTRIBUTES = False
 
 # Namespace for the ``meld:id`` attribute
 MELD_NS = 'http://www.plope.com/software/meld3'
 _MELD_ID = '{%s}id' % MELD_NS
 
+RELAXNG_NS = 'http://relaxng.org/ns/structure/1.0'
+
+
+# The lxml parsers and XPath evaluators are not shared between threads
+_parsers = threading.local()
+_xpaths = threading.local()
+_dummy_makers = threading.local()
+_prototypes = threading.local()
+_xslts = threading.local()
+
+
+def meld_xpath(path):
+    """Compile, once by thread, a XPath expression where the ``meld`` prefix is defined.
+
+    Each thread keeps up to 256 compiled expressions.
+
+    In:
+      - ``path`` -- the XPath expression, with optional ``$variables``
+
+    Return:
+      - the ``etree.XPath`` evaluator
+    """
+    try:
+        xpaths = _xpaths.cache
+    except AttributeError:
+        xpaths = _xpaths.cache = {}
+
+    xpath = xpaths.get(path)
+    if xpath is None:
+        if len(xpaths) > 256:
+            xpaths.clear()
+
+        xpath = xpaths[path] = etree.XPath(path, namespaces={'meld': MELD_NS})
+
+    return xpath
+
+
+def local_parser(parser):
+    """Return the copy of a parser dedicated to the current thread.
+
+    In:
+      - ``parser`` -- the shared parser
+
+    Return:
+      - the parser of the current thread, configured as the shared one
+    """
+    try:
+        copies = _parsers.copies
+    except AttributeError:
+        copies = _parsers.copies = {}
+
+    local = copies.get(parser)
+    if local is None:
+        local = copies[parser] = parser.copy()
+
+    return local
+
+
+def prototype(parser, tag, namespaces):
+    """Return an empty tag of the current thread, with namespaces declarations, to copy.
+
+    Copying it is cheaper than creating a new tag with the same namespaces.
+
+    In:
+      - ``parser`` -- the shared parser creating the tag
+      - ``tag`` -- qualified name of the tag
+      - ``namespaces`` -- namespaces declared by the tag
+
+    Return:
+      - the tag
+    """
+    try:
+        prototypes = _prototypes.elements
+    except AttributeError:
+        prototypes = _prototypes.elements = {}
+
+    key = (parser, tag, tuple(namespaces.items()))
+    element = prototypes.get(key)
+    if element is None:
+        if len(prototypes) > 1024:
+            prototypes.clear()
+
+        element = prototypes[key] = local_parser(parser).makeelement(tag, nsmap=namespaces)
+
+    return element
+
+
+def local_xslt(key, xslt):
+    """Return the copy of a compiled stylesheet dedicated to the current thread.
+
+    In:
+      - ``key`` -- key of the stylesheet
+      - ``xslt`` -- the shared compiled stylesheet
+
+    Return:
+      - the compiled stylesheet of the current thread
+    """
+    try:
+        copies = _xslts.copies
+    except AttributeError:
+        copies = _xslts.copies = {}
+
+    local = copies.get(key)
+    if (local is None) or (local[0] is not xslt):
+        if len(copies) > 256:
+            copies.clear()
+
+        # Copying is cheaper than compiling again
+        local = copies[key] = (xslt, copy.copy(xslt))
+
+    return local[1]
+
+
+def dummy_maker():
+    """Return the ``objectify`` elements factory of the current thread."""
+    try:
+        return _dummy_makers.maker
+    except AttributeError:
+        maker = _dummy_makers.maker = objectify.ElementMaker(
+            annotate=False, makeelement=objectify.makeparser().makeelement
+        )
+
+        return maker
+
+
+# Text of the comment marking the place of the children when an element is serialized alone
+_CHILDREN_MARKER = 'nagare-children'
+
+# Target of the processing instructions wrapping the frozen subtrees
+_FROZEN = 'nagare-frozen'
+_FROZEN_START = '<?%s ' % _FROZEN
+_FROZEN_END = ' /%s' % _FROZEN
+
+
+class Frozen:
+    """A serialized subtree, emitted verbatim by the serializations of the tags.
+
+    Added as a child, it becomes a processing instruction holding the
+    serialized subtree, unwrapped by ``Tag.tostring()`` and ``Tag.iter_tostring()``.
+    As all the processing instructions, it is left out of a ``text`` serialization.
+    """
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        """Initialization.
+
+        In:
+          - ``text`` -- the serialized subtree
+        """
+        if '?>' in text:
+            raise ValueError("a frozen subtree can't contain a processing instruction")
+
+        self.text = text + _FROZEN_END
+
+    def element(self):
+        """Return a new processing instruction holding the serialized subtree."""
+        return etree.ProcessingInstruction(_FROZEN, self.text)
+
+
+def _unfreeze(data, method, encoding):
+    """Unwrap the frozen subtrees of a serialization.
+
+    In:
+      - ``data`` -- the serialization
+      - ``method`` -- serialization method
+      - ``encoding`` -- encoding of the serialization
+
+    Return:
+      - the serialization
+    """
+    # Processing instructions are ended by ``>`` in HTML
+    end = _FROZEN_END + ('>' if method == 'html' else '?>')
+
+    if isinstance(data, str):
+        if _FROZEN_START in data:
+            data = data.replace(_FROZEN_START, '').replace(end, '')
+    elif (encoding is None) or ('<'.encode(encoding) == b'<'):
+        if _FROZEN_START.encode() in data:
+            data = data.replace(_FROZEN_START.encode(), b'').replace(end.encode(), b'')
+    else:
+        data = _unfreeze(data.decode(encoding), method, encoding).encode(encoding)
+
+    return data
+
+
+# ---------------------------------------------------------------------------
+
+
+class LRUCache:
+    """A bounded and thread-safe cache, evicting the least recently used entries."""
+
+    def __init__(self, maxsize=128):
+        """Initialization.
+
+        In:
+          - ``maxsize`` -- maximum number of entries kept
+        """
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the value of an entry, marking it as the most recently used.
+
+        In:
+          - ``key`` -- key of the entry
+          - ``default`` -- value returned if the entry is not found
+
+        Return:
+          - the value found, else the ``default`` value
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def set(self, key, value):
+        """Add or replace an entry, evicting the least recently used ones if full.
+
+        In:
+          - ``key`` -- key of the entry
+          - ``value`` -- value of the entry
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove an entry, if it exists.
+
+        In:
+          - ``key`` -- key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_if(self, predicate):
+        """Remove all the entries with a key matching a predicate.
+
+        In:
+          - ``predicate`` -- function receiving a key and returning ``True`` to remove its entry
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+class DiskCache:
+    """A cache into a directory, shared by the processes and kept across restarts.
+
+    The keys and values are made of ``str``, ``bytes``, numbers, booleans, ``None``
+    and tuples. The entries are invalidated by their keys, never by their age.
+
+    The directory must only be writable by the application.
+    """
+
+    def __init__(self, directory):
+        """Initialization.
+
+        In:
+          - ``directory`` -- directory of the entries, created if needed
+        """
+        self.directory = directory
+        self.hits = self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, hashlib.blake2b(repr(key).encode(), digest_size=20).hexdigest())
+
+    def __len__(self):
+        return len(os.listdir(self.directory))
+
+    def __contains__(self, key):
+        return os.path.exists(self._filename(key))
+
+    def get(self, key, default=None):
+        """Return the value of an entry.
+
+        In:
+          - ``key`` -- key of the entry
+          - ``default`` -- value returned if the entry is not found
+
+        Return:
+          - the value found, else the ``default`` value
+        """
+        try:
+            with open(self._filename(key), 'rb') as f:
+                value = marshal.load(f)  # noqa: S302
+        except (OSError, EOFError, ValueError, TypeError):
+            # Missing or truncated entry
+            self.misses += 1
+            return default
+
+        self.hits += 1
+
+        return value
+
+    def set(self, key, value):
+        """Add or replace an entry.
+
+        An entry that can't be written (read-only directory, full disk or value
+        that can't be marshalled) is not stored.
+
+        In:
+          - ``key`` -- key of the entry
+          - ``value`` -- value of the entry
+        """
+        filename = self._filename(key)
+
+        f = None
+        try:
+            # Atomic replacement: the other processes never read a partial entry
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, prefix='.', delete=False) as f:
+                marshal.dump(value, f)
+            os.replace(f.name, filename)
+        except (OSError, ValueError):
+            if f is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(f.name)
+
+    def invalidate(self, key):
+        """Remove an entry, if it exists.
+
+        In:
+          - ``key`` -- key of the entry
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._filename(key))
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        for filename in os.listdir(self.directory):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, filename))
+
+        self.hits = self.misses = 0
+
+
+class UrlResolver:
+    """Fetch the remote templates, keeping them into a cache.
+
+    A cached template is used as-is during ``ttl`` seconds, then revalidated
+    with a conditional request (``ETag`` / ``Last-Modified``).
+    """
+
+    def __init__(self, ttl=60, timeout=10, max_fetches=8, cache=None):
+        """Initialization.
+
+        In:
+          - ``ttl`` -- number of seconds a fetched template is used without revalidation
+          - ``timeout`` -- timeout, in seconds, of the network requests
+          - ``max_fetches`` -- maximum number of concurrent fetches
+          - ``cache`` -- object with the ``get()`` and ``set()`` methods of a
+            ``LRUCache``, where the fetched templates are kept. A ``DiskCache``
+            keeps them across the restarts
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache = LRUCache() if cache is None else cache
+
+        self._fetches = threading.BoundedSemaphore(max_fetches)
+
+    def fetch(self, url, headers):
+        """Request an url.
+
+        In:
+          - ``url`` -- the url
+          - ``headers`` -- the request headers
+
+        Return:
+          - tuple (``None`` if not modified else the content, response headers)
+        """
+        with self._fetches:
+            try:
+                with urlopen(Request(url, headers=headers), timeout=self.timeout) as response:
+                    return response.read(), response.headers
+            except HTTPError as e:
+                if e.code != 304:
+                    raise
+
+                return None, e.headers
+
+    def __call__(self, url):
+        """Return the content of an url.
+
+        In:
+          - ``url`` -- the url
+
+        Return:
+          - tuple (version of the content, content)
+        """
+        now = time.time()
+
+        entry = self.cache.get(url)
+        if entry is not None:
+            validated, version, data, etag, last_modified = entry
+            if now - validated < self.ttl:
+                return version, data
+
+        headers = {}
+        if entry is not None:
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        content, response_headers = self.fetch(url, headers)
+        if (content is None) and (entry is None):
+            # Not modified but nothing cached: fetch again, bypassing the intermediate caches
+            content, response_headers = self.fetch(url, {'Cache-Control': 'no-cache'})
+            if content is None:
+                raise URLError('%s not modified but not cached' % url)
+
+        if content is not None:
+            data = content
+            version = hashlib.blake2b(data, digest_size=16).digest()
+            etag = last_modified = None
+
+        if response_headers is not None:
+            etag = response_headers.get('ETag', etag)
+            last_modified = response_headers.get('Last-Modified', last_modified)
+
+        self.cache.set(url, (now, version, data, etag, last_modified))
+
+        return version, data
+
+
+# ---------------------------------------------------------------------------
+
+# Instrumentation of the current context and number of instrumentations active in all the contexts
+_instrumentation = contextvars.ContextVar('nagare.renderers.xml.instrumentation', default=None)
+_nb_instrumentations = 0
+_instrumentations_lock = threading.Lock()
+
+
+def instrumentation():
+    """Return the instrumentation of the current context, if any."""
+    return _instrumentation.get() if _nb_instrumentations else None
+
+
+class Instrumentation:
+    """Counters of the rendering phases, collected in the current context.
+
+    Usage:
+      with Instrumentation(callback=report) as stats:
+          ... rendering ...
+
+    A nested instrumentation adds its counters to the enclosing one when it exits.
+    """
+
+    def __init__(self, callback=None):
+        """Initialization.
+
+        In:
+          - ``callback`` -- function called with this instrumentation when it exits
+        """
+        self.callback = callback
+
+        self.elements = 0  # Number of tags created by the renderers
+        self.add_children_calls = 0
+        self.add_children_time = 0.0  # Including the rendering of the children
+        self.meld_lookups = 0
+        self.serializations = 0
+        self.serialized_bytes = 0
+        self.serialization_time = 0.0
+
+        self._adding = False
+        self._token = None
+
+    def as_dict(self):
+        """Return the counters."""
+        return {name: value for name, value in vars(self).items() if not name.startswith('_') and name != 'callback'}
+
+    def __enter__(self):
+        global _nb_instrumentations
+
+        self._token = _instrumentation.set(self)
+        with _instrumentations_lock:
+            _nb_instrumentations += 1
+
+        return self
+
+    def __exit__(self, exception, data, tb):
+        global _nb_instrumentations
+
+        with _instrumentations_lock:
+            _nb_instrumentations -= 1
+        _instrumentation.reset(self._token)
+
+        outer = _instrumentation.get()
+        if outer is not None:
+            for name, value in self.as_dict().items():
+                setattr(outer, name, getattr(outer, name) + value)
+
+        if self.callback is not None:
+            self.callback(self)
+
+    def add_children(self, tag, children, attrib):
+        """Time the outermost ``add_children()`` calls."""
+        self._adding = True
+        start = time.perf_counter()
+        try:
+            tag.add_children(children, attrib)
+        finally:
+            self.add_children_time += time.perf_counter() - start
+            self.add_children_calls += 1
+            self._adding = False
+
+    def serialized(self, data, start):
+        """Count a serialization.
+
+        In:
+          - ``data`` -- the serialized data
+          - ``start`` -- ``time.perf_counter()`` value when the serialization started
+        """
+        self.serialization_time += time.perf_counter() - start
+        self.serialized_bytes += len(data)
+        self.serializations += 1
+
+        return data
+
+    def iter_serialized(self, chunks):
+        """Count a chunked serialization, excluding the time spent by the consumer of the chunks."""
+        start = time.perf_counter()
+        for chunk in chunks:
+            self.serialization_time += time.perf_counter() - start
+            self.serialized_bytes += len(chunk)
+            yield chunk
+            start = time.perf_counter()
+
+        self.serialization_time += time.perf_counter() - start
+        self.serializations += 1
+
+
 # ---------------------------------------------------------------------------
 
 
 class Renderable:
+    # Key of the rendering into the ``fragments_cache`` of the renderer or ``None`` to not cache it.
+    # Must be unique among all the cached components, e.g. ``('product-card', product.id)``.
+    # A cached rendering is reused as is: it must not contain ids from ``generate_id()``.
+    # Removed from the cache by ``XmlRenderer.invalidate_fragment(cache_key)``
+    cache_key = None
+
     def render(self, renderer):
         return self
 
@@ -35,24 +619,249 @@ def is_iterable(o):
     return not isinstance(o, (str, Tag, dict, etree._Element, bytes)) and isinstance(o, Iterable)
 
 
+# Types of the children never flattened, i.e neither ``Renderable`` nor iterable
+_leaf_types = {str: True, int: True, float: True, bool: True, type(None): True, list: False, tuple: False}
+
+
+def _is_leaf_type(t):
+    leaf = _leaf_types.get(t)
+    if leaf is None:
+        if len(_leaf_types) > 1024:
+            _leaf_types.clear()
+
+        leaf = _leaf_types[t] = not issubclass(t, Renderable) and (
+            issubclass(t, (str, dict, etree._Element, bytes)) or not issubclass(t, Iterable)
+        )
+
+    return leaf
+
+
 def flatten(l, renderer):  # noqa: E741
-    for e in l:
-        if isinstance(e, Renderable):
-            e = e.render(renderer)
+    """Flatten the children, rendering the ``Renderable`` objects.
 
-        if is_iterable(e):
-            yield from flatten(e, renderer)
-        else:
-            yield e
+    The nested iterables are walked with an explicit stack of iterators, so
+    the nesting depth is not limited by the recursion limit.
+
+    In:
+      - ``l`` -- the children
+      - ``renderer`` -- the renderer passed to the ``Renderable`` objects
+
+    Return:
+      - the children
+    """
+    if (type(l) in (list, tuple)) and all(map(_is_leaf_type, set(map(type, l)))):
+        # Already flat
+        yield from l
+        return
+
+    leaf_types = _leaf_types
+    stack = []
+    it = iter(l)
+
+    try:
+        while True:
+            for e in it:
+                leaf = leaf_types.get(type(e))
+                if leaf or ((leaf is None) and _is_leaf_type(type(e))):
+                    yield e
+                    continue
+
+                if isinstance(e, Renderable):
+                    key = e.cache_key
+                    e = e.render(renderer) if key is None else _render_cached(e, key, renderer)
+                    if not is_iterable(e):
+                        yield e
+                        continue
+
+                stack.append(it)
+                it = iter(e)
+                break
+            else:
+                if not stack:
+                    return
+
+                it = stack.pop()
+    except GeneratorExit:
+        # Close the nested generators, as ``yield from`` does
+        for iterator in (it, *stack):
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        raise
+
+
+def _render_cached(renderable, key, renderer):
+    """Render a component, or copy its rendering from the ``fragments_cache`` of the renderer.
+
+    In:
+      - ``renderable`` -- the component
+      - ``key`` -- key of the rendering into the cache
+      - ``renderer`` -- the renderer
+
+    Return:
+      - the rendering
+    """
+    cache = getattr(renderer, 'fragments_cache', None)
+    if cache is None:
+        return renderable.render(renderer)
+
+    key = renderer.fragment_key(key)
+    fragment = cache.get(key)
+    if fragment is None:
+        rendering = list(flatten([renderable.render(renderer)], renderer))
+
+        if not any(map(is_async, rendering)):
+            # Keep private master copies of the tags
+            cache.set(key, tuple(copy.deepcopy(e) if isinstance(e, etree._Element) else e for e in rendering))
+
+        return rendering
+
+    rendering = []
+    for e in fragment:
+        if isinstance(e, etree._Element):
+            e = copy.deepcopy(e)
+            if isinstance(e, Tag):
+                e._renderer = renderer
+
+        rendering.append(e)
+
+    return rendering
+
+
+def is_async(o):
+    return inspect.isawaitable(o) or isinstance(o, AsyncIterable)
+
+
+async def aflatten(l, renderer):  # noqa: E741
+    """Flatten the children, resolving the awaitables and the asynchronous iterables.
+
+    The sibling awaitables and asynchronous iterables are resolved concurrently.
+
+    In:
+      - ``l`` -- the children
+      - ``renderer`` -- the renderer passed to the ``Renderable`` objects
+
+    Return:
+      - the list of the children
+    """
+    children = list(flatten(l, renderer))
+
+    positions = [i for i, e in enumerate(children) if is_async(e)]
+    if not positions:
+        return children
+
+    results = await asyncio.gather(*[_resolve(children[i], renderer) for i in positions])
+
+    # Replace each asynchronous child by its resolved children
+    for i, result in zip(reversed(positions), reversed(results)):
+        children[i : i + 1] = result
+
+    return children
+
+
+async def _resolve(o, renderer):
+    """Resolve an awaitable or an asynchronous iterable.
+
+    In:
+      - ``o`` -- the awaitable or asynchronous iterable
+      - ``renderer`` -- the renderer passed to the ``Renderable`` objects
+
+    Return:
+      - the list of the resolved children
+    """
+    children = [e async for e in o] if isinstance(o, AsyncIterable) else [await o]
+
+    return await aflatten(children, renderer)
 
 
 # ---------------------------------------------------------------------------
 
+# Registry of the documents with ``meld:id`` indexes. A change only searches for
+# indexes to invalidate if its document is registered.
+# The roots are kept alive by the ``_meld_root`` attribute of their indexed tags
+# so their ``id()`` are stable.
+# ``id()`` of a document root -> ``id()`` of the indexed tags of the document
+_meld_documents = {}
+# ``id()`` of an indexed tag -> (weak reference to the tag, ``id()`` of the roots of its documents)
+_meld_tags = {}
+# ``id()`` of the indexed tags garbage collected, unregistered under the lock
+_meld_removals = []
+_meld_lock = threading.Lock()
+
+
+def _purge_meld_documents():
+    """Unregister the indexed tags garbage collected. Called with ``_meld_lock`` held."""
+    while _meld_removals:
+        key = _meld_removals.pop()
+
+        ref, roots = _meld_tags.get(key, (None, ()))
+        if (ref is None) or (ref() is not None):
+            # Already unregistered or ``id()`` reused by a new indexed tag
+            continue
+
+        del _meld_tags[key]
+        for root in roots:
+            tags = _meld_documents.get(root)
+            if tags is not None:
+                tags.discard(key)
+                if not tags:
+                    del _meld_documents[root]
+
+
+def _register_meld_documents(root, tags):
+    """Register the document of indexed tags. Called with ``_meld_lock`` held.
+
+    In:
+      - ``root`` -- root of the document
+      - ``tags`` -- the indexed tags
+    """
+    root_key = id(root)
+    documents = _meld_documents.setdefault(root_key, set())
+
+    for tag in tags:
+        key = id(tag)
+        if key not in _meld_tags:
+            _meld_tags[key] = (weakref.ref(tag, lambda ref, key=key: _meld_removals.append(key)), set())
+
+        tag._meld_root = root
+        _meld_tags[key][1].add(root_key)
+        documents.add(key)
+
+
+def _meld_document(element):
+    """Return the ``id()`` of the root of the document of an element, if it has indexed tags, else ``None``."""
+    key = id(element.getroottree().getroot())
+
+    with _meld_lock:
+        if _meld_removals:
+            _purge_meld_documents()
+
+        return key if key in _meld_documents else None
+
+
+def _move_meld_documents(roots, element):
+    """Register the indexed tags of documents moved into the document of an element.
+
+    In:
+      - ``roots`` -- ``id()`` of the roots of the moved documents
+      - ``element`` -- the element
+    """
+    root = element.getroottree().getroot()
+
+    with _meld_lock:
+        _purge_meld_documents()
+
+        tags = [_meld_tags[key][0]() for root_key in roots for key in _meld_documents.get(root_key, ())]
+        _register_meld_documents(root, [tag for tag in tags if tag is not None])
+
 
 class Tag(etree.ElementBase):
     """A xml tag."""
 
-    _dummy_maker = objectify.ElementMaker(annotate=False)
+    # Index of the ``meld:id`` descendants: ``False`` if not enabled, ``None`` if it must be rebuilt
+    _meld_index = False
+    # Valid attributes names, checked when added if ``CHECK_ATTRIBUTES`` is set
+    _authorized_attribs = None
 
     def init(self, renderer):
         """Each tag keeps track of the renderer that created it.
@@ -77,31 +886,129 @@ class Tag(etree.ElementBase):
         return getattr(self, '_renderer', None) or getattr(self.root, '_renderer', None)
 
     def on_change(self):
-        if (
-            CHECK_ATTRIBUTES
-            and self._authorized_attribs
-            and not frozenset(self.attrib).issubset(self._authorized_attribs)
-        ):
-            raise AttributeError(
-                'Bad attributes for element <%s>: ' % self.tag
-                + ', '.join(frozenset(self.attrib) - self._authorized_attribs)
-            )
+        """Called each time children or attributes are added."""
+
+    def check_attributes(self, names, authorized_attribs):
+        """Check attributes names against the valid ones.
+
+        In:
+          - ``names`` -- the attributes names
+          - ``authorized_attribs`` -- the valid attributes names
+        """
+        bad = [name for name in names if (name not in authorized_attribs) and not name.startswith('{')]
+        if bad:
+            raise AttributeError('Bad attributes for element <%s>: ' % self.tag + ', '.join(bad))
+
+    def _add_texts(self, last, texts):
+        """Append texts after a child of this tag.
+
+        In:
+          - ``last`` -- the last child or ``None``
+          - ``texts`` -- list of the texts
+        """
+        text = ''.join(texts)
+
+        if last is None:
+            self.text = (self.text or '') + text
+        else:
+            last.tail = (last.tail or '') + text
+
+    def add_attributes(self, attrib):
+        """Add attributes to this tag.
+
+        In:
+          - ``attrib`` -- dictionary of the attributes
+        """
+        if CHECK_ATTRIBUTES and self._authorized_attribs:
+            # Only the added attributes are checked
+            self.check_attributes(attrib, self._authorized_attribs)
+
+        if all(type(value) is str for value in attrib.values()):
+            self.attrib.update(attrib)
+        else:
+            # Values conversion by ``objectify``
+            self.attrib.update(dummy_maker().dummy(attrib).attrib)
 
     def add_children(self, children, attrib=None):
+        """Append children and attributes to this tag.
+
+        In:
+          - ``children`` -- children to add
+          - ``attrib`` -- attributes to add
+        """
         if not children and not attrib:
             return
 
-        dummy = self._dummy_maker.dummy(attrib or {}, *flatten(children, self.renderer))
-
-        if dummy.text:
-            if len(self):
-                self[0].tail = (self[0].tail or '') + dummy.text
+        if _nb_instrumentations:
+            stats = _instrumentation.get()
+            if (stats is not None) and not stats._adding:
+                stats.add_children(self, children, attrib)
+                return
+
+        if attrib:
+            self.add_attributes(attrib)
+
+        # The consecutive texts are joined, then added to the text of the tag or to the tail of its last child
+        texts = []
+        last = self[-1] if len(self) else None
+        # Roots of the documents with ``meld:id`` indexes moved into this tree
+        indexed_roots = set()
+
+        for child in flatten(children, self.renderer):
+            child_type = type(child)
+
+            if child_type is str:
+                texts.append(child)
+            elif isinstance(child, etree._Element):
+                if texts:
+                    self._add_texts(last, texts)
+                    texts = []
+
+                if _meld_documents:
+                    root = _meld_document(child)
+                    if root is not None:
+                        indexed_roots.add(root)
+
+                self.append(child)
+                last = child
+            elif child is None:
+                pass
+            elif child_type is Frozen:
+                if texts:
+                    self._add_texts(last, texts)
+                    texts = []
+
+                last = child.element()
+                self.append(last)
+            elif child_type is dict:
+                self.add_attributes(child)
+            elif (child_type is int) or ((child_type is float) and math.isfinite(child)):
+                texts.append(str(child))
             else:
-                self.text = (self.text or '') + dummy.text
+                # Other types conversion by ``objectify``
+                dummy = dummy_maker().dummy(child)
+                if dummy.text:
+                    texts.append(dummy.text)
+
+                if dummy.attrib:
+                    self.add_attributes(dummy.attrib)
+
+                elements = dummy.getchildren()
+                if elements:
+                    if texts:
+                        self._add_texts(last, texts)
+                        texts = []
+
+                    self.extend(elements)
+                    last = elements[-1]
+
+        if texts:
+            self._add_texts(last, texts)
 
-        self.attrib.update(dummy.attrib)
-        self.extend(dummy.iterchildren())
+        if indexed_roots:
+            _move_meld_documents(indexed_roots, self)
 
+        self.invalidate_meld_index()
         self.on_change()
 
     def __call__(self, *children, **attrib):
@@ -114,12 +1021,35 @@ class Tag(etree.ElementBase):
         Return:
           - ``self``
         """
-        attrib = {
+        self.add_children(children, self._rename_attributes(attrib))
+
+        return self
+
+    @staticmethod
+    def _rename_attributes(attrib):
+        return {
             name.replace('_', '-') if name.startswith('data_') else name.rstrip('_'): value
             for name, value in attrib.items()
         }
 
-        self.add_children(children, attrib)
+    async def aadd_children(self, children, attrib=None):
+        """Asynchronous version of ``add_children()``.
+
+        The children can be awaitables or asynchronous iterables.
+        """
+        self.add_children(await aflatten(children, self.renderer), attrib)
+
+    async def acall(self, *children, **attrib):
+        """Asynchronous version of ``__call__()``.
+
+        In:
+          - ``children`` -- children to add, can be awaitables or asynchronous iterables
+          - ``attrib`` -- attributes to add
+
+        Return:
+          - ``self``
+        """
+        await self.aadd_children(children, self._rename_attributes(attrib))
 
         return self
 
@@ -132,21 +1062,124 @@ class Tag(etree.ElementBase):
         if exception is None:
             self.renderer.exit(self)
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exception, data, tb):
+        if exception is None:
+            await self.renderer.aexit(self)
+
+    def _validate_attributes(self):
+        """Check the attributes of the tree if the check of its renderer is deferred."""
+        renderer = self.renderer
+        if (renderer is not None) and (renderer._check_attributes == 'deferred'):
+            renderer.validate_attributes(self)
+
     def tostring(self, method='xml', encoding='utf-8', pipeline=True, **kw):
         """Serialize in XML the tree beginning at this tag.
 
         In:
           - ``encoding`` -- encoding of the XML
-          - ``pipeline`` -- if False, the ``meld:id`` attributes are deleted
+          - ``pipeline`` -- if False, the ``meld:id`` attributes are not serialized
 
         Return:
           - the XML
         """
-        if not pipeline:
-            for element in self.xpath('.//*[@meld:id]', namespaces={'meld': MELD_NS}):
-                del element.attrib[_MELD_ID]
+        if CHECK_ATTRIBUTES:
+            self._validate_attributes()
 
-        return etree.tostring(self, method=method, encoding=encoding, **kw)
+        stats = instrumentation()
+        if stats is not None:
+            start = time.perf_counter()
+
+        element = self if pipeline else _without_melds(self)
+        data = _unfreeze(etree.tostring(element, method=method, encoding=encoding, **kw), method, encoding)
+
+        return data if stats is None else stats.serialized(data, start)
+
+    def iter_tostring(self, chunk_size=65536, method='xml', encoding='utf-8', pipeline=True, **kw):
+        """Serialize in XML the tree beginning at this tag, chunk by chunk.
+
+        The big subtrees are serialized child by child so the whole document is
+        never kept in memory. A namespace declaration redundant with the ones in
+        scope can be omitted on the first tags of these children.
+
+        In:
+          - ``chunk_size`` -- minimum size of the chunks, except the last one
+          - ``method`` -- serialization method
+          - ``encoding`` -- encoding of the XML
+          - ``pipeline`` -- if False, the ``meld:id`` attributes are not serialized
+          - ``kw`` -- others ``etree.tostring()`` parameters
+
+        Return:
+          - the chunks of the encoded XML
+        """
+        if encoding is None:
+            # Default encoding of ``etree.tostring()``
+            encoding = 'ASCII'
+
+        streamable = (
+            (method in ('xml', 'html'))
+            and (encoding not in (str, 'unicode'))
+            and ('<'.encode(encoding) == b'<')
+            and not kw.get('pretty_print')
+            and set(kw).issubset({'xml_declaration', 'doctype', 'standalone', 'with_tail', 'pretty_print'})
+        )
+
+        if not streamable:
+            # Serialization of the whole tree, then splitted
+            data = self.tostring(method, encoding, pipeline, **kw)
+            for i in range(0, len(data), chunk_size):
+                yield data[i : i + chunk_size]
+
+            return
+
+        stats = instrumentation()
+        if stats is None:
+            yield from self._iter_chunks(chunk_size, method, encoding, pipeline, kw)
+        else:
+            yield from stats.iter_serialized(self._iter_chunks(chunk_size, method, encoding, pipeline, kw))
+
+    def _iter_chunks(self, chunk_size, method, encoding, pipeline, kw):
+        """Serialize the tree beginning at this tag, chunk by chunk.
+
+        In:
+          - ``chunk_size``, ``method``, ``encoding``, ``pipeline``, ``kw`` -- see ``iter_tostring()``
+
+        Return:
+          - the chunks of the encoded XML
+        """
+        if CHECK_ATTRIBUTES:
+            self._validate_attributes()
+
+        marker = ('<!--%s-->' % _CHILDREN_MARKER).encode(encoding)
+        max_nodes = chunk_size // 64  # Average serialized size of an element
+
+        chunk = []
+        size = 0
+        for data in _iter_tostring(self, {}, max_nodes, marker, pipeline, method=method, encoding=encoding, **kw):
+            # A frozen subtree is never splitted between two parts
+            data = _unfreeze(data, method, encoding)
+
+            chunk.append(data)
+            size += len(data)
+
+            if size >= chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+                size = 0
+
+        if chunk:
+            yield b''.join(chunk)
+
+    async def aiter_tostring(self, chunk_size=65536, method='xml', encoding='utf-8', pipeline=True, **kw):
+        """Asynchronous version of ``iter_tostring()``.
+
+        The control is given back to the event loop after each chunk.
+        """
+        for chunk in self.iter_tostring(chunk_size, method, encoding, pipeline, **kw):
+            yield chunk
+            await asyncio.sleep(0)
 
     def findmeld(self, id, default=None):
         """Find a tag with a given ``meld:id`` value.
@@ -158,11 +1191,78 @@ class Tag(etree.ElementBase):
         Return:
           - the tag found, else the ``default`` value
         """
-        nodes = self.xpath('.//*[@meld:id="%s"]' % id, namespaces={'meld': MELD_NS})
+        if self._meld_index is False:
+            if _nb_instrumentations:
+                _count_meld_lookup()
+
+            # The evaluation stops on the first tag found
+            nodes = meld_xpath('descendant::*[@meld:id=$id][1]')(self, id=id)
+        else:
+            nodes = self.findmelds(id)
 
         # Return only the first tag found
         return nodes[0] if len(nodes) != 0 else default
 
+    def findmelds(self, id):
+        """Find all the tags with a given ``meld:id`` value.
+
+        In:
+          - ``id`` -- value of the ``meld:id`` attribute to search
+
+        Return:
+          - the list of the tags found, in document order
+        """
+        if _nb_instrumentations:
+            _count_meld_lookup()
+
+        index = self._meld_index
+        if index is None:
+            index = self.index_melds()._meld_index
+
+        if index is False:
+            return meld_xpath('descendant::*[@meld:id=$id]')(self, id=id)
+
+        # Ignore the tags whose ``meld:id`` was directly changed or moved out of this tree
+        return [
+            element
+            for element in index.get(id, ())
+            if (element.get(_MELD_ID) == id) and (self in element.iterancestors())
+        ]
+
+    def index_melds(self):
+        """Index all the descendant tags by their ``meld:id`` value.
+
+        Then ``findmeld()`` and ``findmelds()`` are dictionary lookups. The index is
+        invalidated and lazily rebuilt each time the tree is changed by the methods
+        of the tags, but an element added directly with the ``lxml`` API, or this
+        tag moved with it into another tree, needs a new call to this method.
+
+        Return:
+          - ``self``
+        """
+        index = {}
+        for element in meld_xpath('descendant::*[@meld:id]')(self):
+            index.setdefault(element.get(_MELD_ID), []).append(element)
+
+        self._meld_index = index
+
+        root = self.getroottree().getroot()
+        with _meld_lock:
+            _purge_meld_documents()
+            _register_meld_documents(root, [self])
+
+        return self
+
+    def invalidate_meld_index(self):
+        """The ``meld:id`` indexes of this tag and of its ancestors will be rebuilt."""
+        if not _meld_documents or (_meld_document(self) is None):
+            return
+
+        for element in chain((self,), self.iterancestors()):
+            # An empty index is invalidated too
+            if isinstance(getattr(element, '_meld_index', None), dict):
+                element._meld_index = None
+
     def meld_id(self, id):
         """Set the value of the attribute ``meld:id`` of this tag.
 
@@ -173,6 +1273,7 @@ class Tag(etree.ElementBase):
           - ``self``
         """
         self.set(_MELD_ID, id)
+        self.invalidate_meld_index()
 
         return self
 
@@ -188,6 +1289,7 @@ class Tag(etree.ElementBase):
         """
         del self[:]
         self.text = None
+        self.invalidate_meld_index()
 
         return self.__call__(*children, **attrib)
 
@@ -207,14 +1309,114 @@ class Tag(etree.ElementBase):
             i = parent.index(self)
             parent.fill(parent.text or '', parent[:i], children, self.tail or '', parent[i + 1 :])
 
-            if len(parent) >= nb_siblings:
-                parent[i - nb_siblings].tail = tail
+            if len(parent) >= nb_siblings:
+                parent[i - nb_siblings].tail = tail
+
+        return self
+
+    def freeze(self, method='xml', pipeline=False):
+        """Serialize once this subtree, to be added verbatim into other trees.
+
+        The frozen subtree is left out when the trees are serialized with the ``text`` method.
+        Its tags can't be found by ``findmeld()`` so, by default, its ``meld:id`` attributes
+        and namespace declarations are not serialized.
+
+        In:
+          - ``method`` -- serialization method
+          - ``pipeline`` -- if True, the ``meld:id`` attributes are serialized, whatever
+            the ``pipeline`` parameter of the final serialization
+
+        Return:
+          - the ``Frozen`` subtree, to add as a child of the tags
+        """
+        element = self if pipeline else _without_melds(self)
+        if element is not self:
+            # Private copy: the unused ``meld`` namespace declarations are removed
+            prefixes = {prefix for e in element.iter() for prefix, uri in e.nsmap.items() if uri != MELD_NS}
+            etree.cleanup_namespaces(element, keep_ns_prefixes=prefixes - {None})
+
+        return Frozen(element.tostring(method=method, encoding='unicode', with_tail=False))
+
+    def transform(self, stylesheet, **params):
+        """Transform the tree beginning at this tag by a XSLT stylesheet.
+
+        The compiled stylesheets are cached by the renderers, see ``XmlRenderer.xslt()``.
+
+        In:
+          - ``stylesheet`` -- the stylesheet, see ``XmlRenderer.xslt()``
+          - ``params`` -- the stylesheet parameters: ``str``, ``bool``, ``int`` or ``float``
+            values, or ``etree.XPath`` expressions
+
+        Return:
+          - the root of the result tree, or ``None`` if the result has no element
+        """
+        renderer = self.renderer or XmlRenderer()
+
+        params = {name: _xslt_param(value) for name, value in params.items()}
+
+        # A stylesheet is applied on the whole document of a tag
+        source = self if self.getparent() is None else copy.deepcopy(self)
+
+        root = renderer.xslt(stylesheet)(source, **params).getroot()
+        if root is not None:
+            root._renderer = renderer
+
+        return root
+
+    def validate(self, schema, path=None, rate=None, kind=None):
+        """Validate the tree beginning at this tag against a XSD or RelaxNG schema.
+
+        The compiled schemas are kept into the ``schemas_cache`` of the renderers.
+        The ``meld:id`` attributes are not validated and neither are the frozen subtrees.
+
+        In:
+          - ``schema`` -- a filename or an url, a XML text, the root or tree
+            of a parsed schema, or a compiled schema
+          - ``path`` -- XPath of the subtrees to validate, selecting only elements, else the whole
+            tree is validated
+          - ``rate`` -- fraction of the calls really validating, by default the
+            ``validation_rate`` of the renderer
+          - ``kind`` -- 'xsd' or 'relaxng', by default guessed from the schema
+
+        Return:
+          - ``True`` if the tree was validated, ``False`` if the validation was skipped
+
+        Raise:
+          - ``etree.DocumentInvalid`` if a subtree is invalid
+        """
+        renderer = self.renderer or XmlRenderer()
+
+        rate = renderer.validation_rate if rate is None else rate
+        if (rate < 1) and (random.random() >= rate):
+            return False
+
+        validator, lock = renderer._schema(schema, kind)
+
+        if path is None:
+            elements = (self,)
+        else:
+            elements = meld_xpath(path)(self)
+            if not isinstance(elements, list) or not all(
+                isinstance(element, etree._Element) and isinstance(element.tag, str) for element in elements
+            ):
+                raise ValueError('the path %r must select elements' % path)
+
+        for element in elements:
+            if meld_xpath('descendant-or-self::*[@meld:id]')(element):
+                element = copy.deepcopy(element)
+                etree.strip_attributes(element, _MELD_ID)
+
+            with lock:
+                validator.assertValid(element)
 
-        return self
+        return True
 
     def repeat(self, iterable, childname=None):
         """Iterate over a sequence, cloning a new child each time.
 
+        When the length of the sequence is known (see ``operator.length_hint()``),
+        the clones are deep copied in batches.
+
         In:
           - ``iterable`` -- the sequence
           - ``childname`` -- If ``None``, clone this tag each time else
@@ -228,15 +1430,185 @@ class Tag(etree.ElementBase):
 
         parent = element.getparent()
         parent.remove(element)
+        parent.invalidate_meld_index()
+
+        renderer = element.renderer
+        clones = _clones(element, operator.length_hint(iterable))
 
         for thing in iterable:
-            clone = copy.deepcopy(element)
-            clone._renderer = element.renderer
+            clone = next(clones)
+            clone._renderer = renderer
+            if element._meld_index is not False:
+                # The clone is indexed on its first lookup
+                clone._meld_index = None
+
             parent.append(clone)
+            parent.invalidate_meld_index()
 
             yield clone, thing
 
 
+def _xslt_param(value):
+    """Convert a value to a XSLT parameter.
+
+    In:
+      - ``value`` -- a ``str``, ``bool``, ``int`` or ``float`` value, or an ``etree.XPath`` expression
+
+    Return:
+      - the parameter
+    """
+    if isinstance(value, str):
+        return etree.XSLT.strparam(value)
+
+    if isinstance(value, bool):
+        return 'true()' if value else 'false()'
+
+    if isinstance(value, (int, float)):
+        if math.isnan(value):
+            return '(0 div 0)'
+
+        return repr(value) if math.isfinite(value) else '(%d div 0)' % (1 if value > 0 else -1)
+
+    if isinstance(value, etree.XPath):
+        return value
+
+    raise TypeError("can't pass a %s value as a XSLT parameter" % type(value).__name__)
+
+
+def _count_meld_lookup():
+    stats = _instrumentation.get()
+    if stats is not None:
+        stats.meld_lookups += 1
+
+
+def _count_element():
+    stats = _instrumentation.get()
+    if stats is not None:
+        stats.elements += 1
+
+
+def _clones(element, nb, batch_size=256):
+    """Generate deep copies of an element.
+
+    The first ``nb`` copies are created by batches: a container of ``batch_size``
+    copies is built once then, for each batch, deep copied in a single call.
+
+    In:
+      - ``element`` -- the element to copy
+      - ``nb`` -- number of copies to create by batches
+      - ``batch_size`` -- number of copies by batch
+
+    Return:
+      - the copies
+    """
+    if nb > 1:
+        batch = element.makeelement('batch')
+        batch.extend(copy.deepcopy(element) for _ in range(min(nb, batch_size)))
+
+        while nb > 0:
+            copies = copy.deepcopy(batch) if nb > batch_size else batch
+            yield from copies.getchildren()[:nb]
+            nb -= batch_size
+
+    while True:
+        yield copy.deepcopy(element)
+
+
+def _strip_namespaces(data, nsmap, encoding):
+    """Remove, from the first tag, the namespaces declarations already in scope.
+
+    In:
+      - ``data`` -- the serialized element
+      - ``nsmap`` -- the namespaces in scope
+      - ``encoding`` -- encoding of the serialization
+
+    Return:
+      - the serialized element
+    """
+    tag, end, data = data.partition(b'>')
+
+    for prefix, uri in nsmap.items():
+        uri = uri.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;')
+        declaration = ' xmlns="%s"' % uri if prefix is None else ' xmlns:%s="%s"' % (prefix, uri)
+        tag = tag.replace(declaration.encode(encoding), b'', 1)
+
+    return tag + end + data
+
+
+def _is_big(element, max_nodes):
+    """Test if an element has more descendants than ``max_nodes``, without counting them all."""
+    return (len(element) != 0) and (next(islice(element.iter(), max_nodes, None), None) is not None)
+
+
+def _without_melds(element):
+    """Return the tree to serialize without its ``meld:id`` attributes.
+
+    In:
+      - ``element`` -- root of the tree
+
+    Return:
+      - the element if the tree has no ``meld:id`` attributes, else a private copy without them
+    """
+    if not meld_xpath('descendant-or-self::*[@meld:id][1]')(element):
+        return element
+
+    element = copy.deepcopy(element)
+    etree.strip_attributes(element, _MELD_ID)
+
+    return element
+
+
+def _iter_tostring(element, nsmap, max_nodes, marker, pipeline=True, with_tail=True, **kw):
+    """Serialize an element, child by child if it has too many descendants.
+
+    Only the small parts, of at most ``max_nodes`` elements, are copied to
+    remove their ``meld:id`` attributes.
+
+    In:
+      - ``element`` -- the element
+      - ``nsmap`` -- the namespaces in scope of the parent of the element
+      - ``max_nodes`` -- number of descendant elements above which the children are serialized one by one
+      - ``marker`` -- the serialized comment used to split the start and end tags
+      - ``pipeline`` -- if False, the ``meld:id`` attributes are not serialized
+      - ``with_tail`` -- serialize the tail of the element
+      - ``kw`` -- ``etree.tostring()`` parameters
+
+    Return:
+      - the serialized parts
+    """
+    if not _is_big(element, max_nodes):
+        data = etree.tostring(element if pipeline else _without_melds(element), with_tail=with_tail, **kw)
+        yield _strip_namespaces(data, nsmap, kw['encoding']) if nsmap else data
+        return
+
+    # Serialization of the element without its children
+    element_nsmap = element.nsmap
+    attrib = element.attrib
+    if not pipeline and (_MELD_ID in attrib):
+        attrib = {name: value for name, value in attrib.items() if name != _MELD_ID}
+    shallow = etree.Element(element.tag, attrib, nsmap=element_nsmap)
+    shallow.text = element.text
+    shallow.append(etree.Comment(_CHILDREN_MARKER))
+    if with_tail:
+        shallow.tail = element.tail
+
+    start, end = etree.tostring(shallow, **kw).split(marker)
+    yield _strip_namespaces(start, nsmap, kw['encoding']) if nsmap else start
+
+    kw = {'method': kw['method'], 'encoding': kw['encoding'], 'xml_declaration': False}
+    for child in element:
+        if not isinstance(child.tag, str):
+            # Comment, processing instruction or entity
+            yield etree.tostring(child, **kw)
+        elif not _is_big(child, max_nodes):
+            data = etree.tostring(child if pipeline else _without_melds(child), **kw)
+            yield _strip_namespaces(data, element_nsmap, kw['encoding']) if element_nsmap else data
+        else:
+            yield from _iter_tostring(child, element_nsmap, max_nodes, marker, pipeline, **kw)
+
+    yield end
+
+
 class TagProp:
     """Tag factory with a behavior of an object attribute.
 
@@ -271,11 +1643,17 @@ class TagProp:
             element = self._factory()
             element.tag = self._name
             element.init(renderer)
+
+            if _nb_instrumentations:
+                _count_element()
         else:
             element = renderer.makeelement(self._name)
 
-        if CHECK_ATTRIBUTES:
-            element._authorized_attribs = self._authorized_attribs
+        if CHECK_ATTRIBUTES and self._authorized_attribs:
+            if renderer._check_attributes == 'immediate':
+                element._authorized_attribs = self._authorized_attribs
+            elif renderer._check_attributes == 'deferred':
+                renderer._deferred_tags[element] = self._authorized_attribs
 
         return element
 
@@ -283,23 +1661,140 @@ class TagProp:
 # -----------------------------------------------------------------------
 
 
+# The ``IdGenerator`` to reset in a forked process
+_id_generators = weakref.WeakSet()
+
+
+def _reset_id_generators():
+    for generator in list(_id_generators):
+        generator.reset()
+
+
+# A forked process must not generate the same ids than its parent
+os.register_at_fork(after_in_child=_reset_id_generators)
+
+
+class IdGenerator:
+    """Ids unique in the process: a random salt of the process followed by a counter."""
+
+    def __init__(self):
+        self.reset()
+        _id_generators.add(self)
+
+    def reset(self):
+        """Draw a new salt and restart the counter."""
+        self.salt = '%x_' % random.getrandbits(32)
+        self._counter = count()
+
+    def __call__(self, prefix=''):
+        """Generate an id.
+
+        In:
+          - ``prefix`` -- prefix of the generated id
+        """
+        return prefix + self.salt + str(next(self._counter))
+
+
+class DeterministicIdGenerator:
+    """Ids unique for the renderers sharing this generator, identical from a rendering to another.
+
+    Useful to generate cacheable output.
+    """
+
+    def __init__(self, start=0):
+        """Initialization.
+
+        In:
+          - ``start`` -- first value of the counter
+        """
+        self._counter = count(start)
+
+    def __call__(self, prefix=''):
+        """Generate an id.
+
+        In:
+          - ``prefix`` -- prefix of the generated id
+        """
+        return prefix + str(next(self._counter))
+
+
+class classorinstancemethod:
+    """Method receiving the instance or, when called on the class, the class."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def __get__(self, instance, cls):
+        return self.f.__get__(cls if instance is None else instance)
+
+
 class XmlRenderer:
     """The base class of all the renderers that generate a XML dialect."""
 
     doctype = ''
     content_type = 'text/xml'
 
+    # Process-wide cache of the parsed templates. Set to ``None`` to disable it
+    templates_cache = LRUCache(256)
+    # Index the ``meld:id`` of the parsed templates (see ``Tag.index_melds()``)
+    meld_index = False
+    # Number of configured parsers kept by each thread
+    parsers_pool_size = 32
+    # When ``CHECK_ATTRIBUTES`` is set, the attributes of the tags created by ``TagProp`` are checked:
+    # 'immediate' -- each time attributes are added
+    # 'deferred' -- by a walk of the tree when serialized
+    attributes_check = 'immediate'
+    # Fraction of the renderers, randomly chosen, checking the attributes
+    attributes_check_rate = 1.0
+    _check_attributes = None
+    # Compiled XSLT stylesheets
+    stylesheets_cache = LRUCache(64)
+    # Compiled XSD and RelaxNG schemas
+    schemas_cache = LRUCache(32)
+    # Fraction of the ``Tag.validate()`` calls really validating
+    validation_rate = 1.0
+    # Renderings of the ``Renderable`` components with a ``cache_key``
+    fragments_cache = LRUCache(256)
+    # Fetcher of the remote templates
+    url_resolver = UrlResolver()
+    # Size of the chunks fed to the parser when parsing a fragment
+    fragment_chunk_size = 65536
+    # Process-wide generator of the ids
+    id_generator = IdGenerator()
+
+    # Shared parser, only used as a template for the per-thread parsers
     _parser = etree.XMLParser()
     _parser.set_element_class_lookup(etree.ElementDefaultClassLookup(element=Tag))
 
-    def __init__(self, parent=None, *args, **kw):
-        """Renderer initialisation."""
+    def __init__(self, parent=None, *args, id_generator=None, **kw):
+        """Renderer initialisation.
+
+        In:
+          - ``parent`` -- the parent renderer
+          - ``id_generator`` -- generator of the ids, by default the one of the
+            parent renderer or the ``id_generator`` of the class
+        """
         if parent is None:
             self.namespaces = None
             self._default_namespace = None
         else:
             self.namespaces = parent.namespaces
             self._default_namespace = parent._default_namespace
+            id_generator = id_generator or parent.id_generator
+
+        if id_generator is not None:
+            self.id_generator = id_generator
+
+        if CHECK_ATTRIBUTES:
+            # The tags of a sampled renderer and of its children renderers are checked
+            if parent is not None:
+                self._check_attributes = parent._check_attributes
+            elif random.random() < self.attributes_check_rate:
+                self._check_attributes = self.attributes_check
+
+            if self._check_attributes == 'deferred':
+                # The tags to check, kept alive, with their valid attributes names
+                self._deferred_tags = {} if parent is None else parent._deferred_tags
 
         self.parent = parent
         self._prefix = ''
@@ -318,14 +1813,195 @@ class XmlRenderer:
         """
         raise TypeError("can't pickle Renderer objects (are you using a renderer object in a callback?)")
 
+    def xslt(self, stylesheet):
+        """Return a compiled XSLT stylesheet, dedicated to the current thread.
+
+        The compiled stylesheets are kept into the ``stylesheets_cache``, shared
+        by all the renderers, then copied for each thread.
+
+        In:
+          - ``stylesheet`` -- a filename or an url, a XML text, the root or tree
+            of a parsed stylesheet, or a compiled stylesheet
+
+        Return:
+          - the compiled stylesheet
+        """
+        if isinstance(stylesheet, etree.XSLT):
+            return stylesheet
+
+        key, data = self._resource_key(stylesheet)
+
+        xslt = self.stylesheets_cache.get(key)
+        if xslt is None:
+            xslt = etree.XSLT(self._load_resource(key, stylesheet, data))
+            self.stylesheets_cache.set(key, xslt)
+
+        return local_xslt(key, xslt)
+
+    def fragment_key(self, key):
+        """Return the key of a rendering into the ``fragments_cache``.
+
+        The renderings are only shared by the renderers of the same class and namespaces.
+
+        In:
+          - ``key`` -- the ``cache_key`` of the component
+
+        Return:
+          - the key
+        """
+        return (
+            type(self),
+            self._prefix,
+            frozenset((self.namespaces or {}).items()),
+            self._default_namespace,
+            key,
+        )
+
+    @classorinstancemethod
+    def invalidate_fragment(self, key):
+        """Remove from the ``fragments_cache`` all the renderings of a component.
+
+        The renderings of all the renderers classes and namespaces are removed.
+
+        In:
+          - ``key`` -- the ``cache_key`` of the component
+        """
+        cache = self.fragments_cache
+        if cache is not None:
+            cache.invalidate_if(lambda fragment_key: fragment_key[-1] == key)
+
+    def _resource_key(self, source):
+        """Return the cache key of a stylesheet or a schema.
+
+        In:
+          - ``source`` -- a filename or an url, a XML text (``bytes`` or ``str``
+            beginning with ``<``) or a parsed document
+
+        Return:
+          - tuple (key, the content of an url or ``None``)
+        """
+        data = None
+
+        if isinstance(source, str) and source.lstrip().startswith('<'):
+            # XML text
+            key = ('string', hashlib.blake2b(source.encode('utf-8'), digest_size=16).digest())
+        elif isinstance(source, bytes):
+            key = ('string', hashlib.blake2b(source, digest_size=16).digest())
+        elif not isinstance(source, str):
+            # Parsed document
+            key = ('tree', source)
+        elif source.startswith(('http://', 'https://', 'ftp://')):
+            version, data = self.url_resolver(source)
+            key = ('url', source, version)
+        else:
+            stat = os.stat(source)
+            key = ('file', os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+
+        return key, data
+
+    @staticmethod
+    def _load_resource(key, source, data):
+        """Parse a stylesheet or a schema.
+
+        In:
+          - ``key`` -- the cache key of the source
+          - ``source`` -- a filename or an url, a XML text or a parsed document
+          - ``data`` -- the content of an url
+
+        Return:
+          - the parsed document
+        """
+        if key[0] == 'string':
+            if isinstance(source, str):
+                # The encoding declaration of the text is overridden
+                return etree.fromstring(source.encode('utf-8'), etree.XMLParser(encoding='utf-8'))
+
+            return etree.fromstring(source)
+
+        if key[0] == 'url':
+            return etree.fromstring(data, base_url=source)
+
+        return etree.parse(source) if key[0] == 'file' else source
+
+    def _schema(self, schema, kind=None):
+        """Return a compiled XSD or RelaxNG schema.
+
+        The compiled schemas are kept into the ``schemas_cache``, shared by all
+        the renderers.
+
+        In:
+          - ``schema`` -- a filename or an url, a XML text, the root or tree
+            of a parsed schema, or a compiled schema
+          - ``kind`` -- 'xsd' or 'relaxng'. By default, guessed from the root of the schema
+
+        Return:
+          - tuple (compiled schema, lock to hold while validating)
+        """
+        if isinstance(schema, etree._Validator):
+            return schema, contextlib.nullcontext()
+
+        key, data = self._resource_key(schema)
+        key = (kind,) + key
+
+        validator = self.schemas_cache.get(key)
+        if validator is None:
+            document = self._load_resource(key[1:], schema, data)
+
+            if kind is None:
+                root = document.getroot() if isinstance(document, etree._ElementTree) else document
+                kind = 'relaxng' if etree.QName(root).namespace == RELAXNG_NS else 'xsd'
+
+            if kind not in ('xsd', 'relaxng'):
+                raise ValueError('unknown schema kind %r' % kind)
+
+            compiled = (etree.RelaxNG if kind == 'relaxng' else etree.XMLSchema)(document)
+
+            # The compiled schemas are shared by the threads but not their error logs
+            validator = (compiled, threading.Lock())
+            self.schemas_cache.set(key, validator)
+
+        return validator
+
+    def validate_attributes(self, root):
+        """Check, in one walk, the attributes of the tags of a tree created by the ``TagProp``.
+
+        Only the tags created by this renderer, or by its children renderers,
+        when its attributes check is deferred are checked.
+
+        In:
+          - ``root`` -- root of the tree
+        """
+        tags = getattr(self, '_deferred_tags', None)
+        if not tags:
+            return
+
+        for element in root.iter(etree.Element):
+            authorized_attribs = tags.get(element)
+            if authorized_attribs and element.attrib:
+                element.check_attributes(element.attrib, authorized_attribs)
+
     @staticmethod
-    def generate_id(prefix=''):
-        """Generate a random id.
+    def instrument(callback=None):
+        """Collect the counters of the rendering phases in the current context.
+
+        In:
+          - ``callback`` -- function called with the ``Instrumentation`` object at the end
+
+        Return:
+          - the ``Instrumentation`` context manager
+        """
+        return Instrumentation(callback)
+
+    @classorinstancemethod
+    def generate_id(self, prefix=''):
+        """Generate an unique id.
+
+        Called on the class, the ``id_generator`` of the class is used.
 
         In:
           - ``prefix`` -- prefix of the generated id
         """
-        return prefix + str(random.randint(10000000, 99999999))
+        return self.id_generator(prefix)
 
     @staticmethod
     def comment(text=''):
@@ -405,10 +2081,16 @@ class XmlRenderer:
           - the new tag
         """
         # Create the tag with in the default namespace
-        element = self._parser.makeelement(self._prefix + tag, nsmap=self.namespaces)
+        if self.namespaces:
+            element = copy.copy(prototype(self._parser, self._prefix + tag, self.namespaces))
+        else:
+            element = local_parser(self._parser).makeelement(self._prefix + tag)
         element.init(self)
 
-        return element(*args, **kw)
+        if _nb_instrumentations:
+            _count_element()
+
+        return element(*args, **kw) if args or kw else element
 
     def enter(self, current):
         """A new tag is pushed by a ``with`` statement.
@@ -423,6 +2105,13 @@ class XmlRenderer:
         """End of a ``with`` statement."""
         current.add_children(self._children.pop())
 
+    async def aexit(self, current):
+        """End of an ``async with`` statement.
+
+        The awaitables and asynchronous iterables pushed are resolved.
+        """
+        await current.aadd_children(self._children.pop())
+
     def __lshift__(self, current):
         """Add a tag to the last tag pushed by a ``with`` statement.
 
@@ -436,11 +2125,37 @@ class XmlRenderer:
 
         return self
 
+    def _template_key(self, source, tags_factory, fragment, encoding, kw):
+        """Key of a parsed template into the templates cache.
+
+        In:
+          - ``source`` -- hashable identity of the XML source
+          - ``tags_factory``, ``fragment``, ``encoding``, ``kw`` -- the parsing options
+
+        Return:
+          - the key or ``None`` if the template can't be cached
+        """
+        if self.templates_cache is None:
+            return None
+
+        key = (source, self._parser.__class__, tags_factory, fragment, encoding, frozenset(kw.items()))
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable parser option
+            return None
+
+        return key
+
     def fromfile(self, source, tags_factory=Tag, fragment=False, no_leading_text=False, encoding='utf-8', **kw):
         """Parse a XML file.
 
+        The parsed templates are kept into the ``templates_cache``, checked
+        against the modification time and size of their file, or against the
+        version of their content returned by the ``url_resolver``.
+
         In:
-          - ``source`` -- can be a filename or a file object
+          - ``source`` -- can be a filename, an url or a file object
           - ``fragment`` -- if ``True``, can parse a XML fragment i.e a XML without
             a unique root
           - ``no_leading_text`` -- if ``fragment`` is ``True``, ``no_leading_text``
@@ -451,51 +2166,172 @@ class XmlRenderer:
           - the root element of the parsed XML, if ``fragment`` is ``False``
           - a list of XML elements, if ``fragment`` is ``True``
         """
-        try:
-            if isinstance(source, str):
-                if source.startswith(('http://', 'https://', 'ftp://')):
-                    source = urlopen(source)
+        key = None
+
+        if isinstance(source, str):
+            if source.startswith(('http://', 'https://', 'ftp://')):
+                version, data = self.url_resolver(source)
+                key = self._template_key(('url', source, version), tags_factory, fragment, encoding, kw)
+                url, source = source, BufferIO(data)
+                # Base url of the relative DTD, entities and XInclude references, as for a ``urlopen()`` response
+                source.geturl = lambda: url
+            else:
+                try:
+                    stat = os.stat(source)
+                except OSError:
+                    pass
                 else:
-                    source = open(source, encoding=encoding)  # noqa: SIM115
+                    key = ('file', os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+                    key = self._template_key(key, tags_factory, fragment, encoding, kw)
+
+        return self._fromfile(key, source, tags_factory, fragment, no_leading_text, encoding, **kw)
+
+    def _fromfile(self, key, source, tags_factory, fragment, no_leading_text, encoding, **kw):
+        """Parse a XML file object, or copy it from the templates cache.
+
+        In:
+          - ``key`` -- key of the template into the cache or ``None`` to not use the cache
+          - ``source`` -- the file object or a filename, only opened if the template is not cached
+          - ``tags_factory``, ``fragment``, ``no_leading_text``, ``encoding``, ``kw`` -- see ``fromfile()``
+
+        Return:
+          - the root element of the parsed XML, if ``fragment`` is ``False``
+          - a list of XML elements, if ``fragment`` is ``True``
+        """
+        master = None if key is None else self.templates_cache.get(key)
+
+        if master is not None:
+            if not isinstance(source, str):
+                source.close()
+
+            # The whole document is copied, with its DTD, comments and processing instructions
+            root = copy.deepcopy(master)
+            if not fragment:
+                root = root.getroot()
+        else:
+            if isinstance(source, str):
+                source = open(source, encoding=encoding)  # noqa: SIM115
+
+            root = self._parse(source, tags_factory, fragment, encoding, **kw)
+
+            if (key is not None) and (root is not None):
+                # Keep a private master document
+                master = root if fragment else root.getroottree()
+                self.templates_cache.set(key, copy.deepcopy(master))
+
+        if not fragment:
+            # Attach the renderer to the root
+            if root is not None:
+                root._renderer = self
+
+                if self.meld_index:
+                    root.index_melds()
+
+            return root
+
+        children = tuple(root)
+        for e in children:
+            if isinstance(e, tags_factory):
+                # Attach the renderer to each roots
+                e._renderer = self
+
+                if self.meld_index:
+                    e.index_melds()
+
+        # Return the children of the dummy root
+        return ((root.text.encode(encoding),) if root.text and not no_leading_text else ()) + children
+
+    def _get_parser(self, tags_factory, encoding, **kw):
+        """Return a parser of the current thread, configured with the parsing options.
+
+        The parsers are not thread-safe so each thread keeps its own pool of
+        already configured parsers.
+
+        In:
+          - ``tags_factory``, ``encoding``, ``kw`` -- see ``fromfile()``
+
+        Return:
+          - the parser
+        """
+        try:
+            parsers = _parsers.pool
+        except AttributeError:
+            parsers = _parsers.pool = {}
+
+        key = (self._parser.__class__, tags_factory, encoding, frozenset(kw.items()))
+        try:
+            parser = parsers.get(key)
+        except TypeError:
+            # Unhashable parser option
+            key = parser = None
 
+        if parser is None:
             # Create a dedicated parser with the ``kw`` parameter
             parser = self._parser.__class__(encoding=encoding, **kw)
             # This parser will generate nodes of type ``Tag``
             parser.set_element_class_lookup(etree.ElementDefaultClassLookup(element=tags_factory))
 
+            if key is not None:
+                if len(parsers) >= self.parsers_pool_size:
+                    # Evict the oldest parser
+                    del parsers[next(iter(parsers))]
+
+                parsers[key] = parser
+
+        return parser
+
+    def _parse(self, source, tags_factory, fragment, encoding, **kw):
+        """Parse a XML file object.
+
+        In:
+          - ``source`` -- the file object
+          - ``tags_factory``, ``fragment``, ``encoding``, ``kw`` -- see ``fromfile()``
+
+        Return:
+          - the root element of the parsed XML, if ``fragment`` is ``False``
+          - the dummy root of the XML elements, if ``fragment`` is ``True``
+        """
+        try:
+            parser = self._get_parser(tags_factory, encoding, **kw)
+
             if not fragment:
                 # Parse a tree (only one root)
                 # ----------------------------
 
-                root = etree.parse(source, parser).getroot()
-                source.close()
-
-                # Attach the renderer to the root
-                if root is not None:
-                    root._renderer = self
-
-                return root
+                return etree.parse(source, parser).getroot()
 
             # Parse a fragment (multiple roots)
             # ---------------------------------
 
-            # Create a dummy root
-            xml = BufferIO(b'<html><body>%s</body></html>' % source.read())
+            # Feed the fragment, wrapped into a dummy root, chunk by chunk
+            chunk = source.read(self.fragment_chunk_size)
+            prefix, suffix = b'<html><body>', b'</body></html>'
+            if isinstance(chunk, str):
+                # File opened in text mode
+                prefix, suffix = prefix.decode(), suffix.decode()
+
+            try:
+                parser.feed(prefix)
+                while chunk:
+                    parser.feed(chunk)
+                    chunk = source.read(self.fragment_chunk_size)
+                parser.feed(suffix)
+            except BaseException:
+                # Reset the parser state before it is reused
+                with contextlib.suppress(etree.XMLSyntaxError):
+                    parser.close()
+                raise
+
+            return parser.close()[0]
         finally:
             source.close()
 
-        root = etree.parse(xml, parser).getroot()[0]
-        for e in root:
-            if isinstance(e, tags_factory):
-                # Attach the renderer to each roots
-                e._renderer = self
-
-        # Return the children of the dummy root
-        return ((root.text.encode(encoding),) if root.text and not no_leading_text else ()) + tuple(root[:])
-
     def fromstring(self, text, tags_factory=Tag, fragment=False, no_leading_text=False, **kw):
         """Parse a XML string.
 
+        The parsed templates are kept into the ``templates_cache``, indexed by
+        a hash of their content.
+
         In:
           - ``text`` -- can be a ``str`` or ``unicode`` string
           - ``fragment`` -- if ``True``, can parse a XML fragment i.e a XML without
@@ -508,10 +2344,14 @@ class XmlRenderer:
           - the root element of the parsed XML, if ``fragment`` is ``False``
           - a list of XML elements, if ``fragment`` is ``True``
         """
+        encoding = kw.pop('encoding', 'utf-8')
         if isinstance(text, str):
-            text = text.encode(kw.setdefault('encoding', 'utf-8'))
+            text = text.encode(encoding)
 
-        return self.fromfile(BufferIO(text), tags_factory, fragment, no_leading_text, **kw)
+        key = ('string', hashlib.blake2b(text, digest_size=16).digest())
+        key = self._template_key(key, tags_factory, fragment, encoding, kw)
+
+        return self._fromfile(key, BufferIO(text), tags_factory, fragment, no_leading_text, encoding, **kw)
 
     @staticmethod
     def start_rendering(*args, **kw):
@@ -525,6 +2365,27 @@ class XmlRenderer:
 # ---------------------------------------------------------------------------
 
 
+class _LearnedTagProp(TagProp):
+    """Tag factory installed on a ``Renderer`` class for a tag name accessed on it."""
+
+    def __init__(self, name, owner):
+        """Initialization.
+
+        In:
+          - ``name`` -- name of the tags to create
+          - ``owner`` -- the ``Renderer`` class that learned the tag name
+        """
+        super().__init__(name)
+        self._owner = owner
+
+    def __get__(self, renderer, cls):
+        if (cls is not self._owner) and (cls.__getattr__ is not Renderer.__getattr__):
+            # A subclass with its own ``__getattr__()`` creates its tags
+            return renderer.__getattr__(self._name)
+
+        return super().__get__(renderer, cls)
+
+
 class Renderer(XmlRenderer):
     """The XML Renderer.
 
@@ -537,13 +2398,27 @@ class Renderer(XmlRenderer):
        '<foo><bar/></foo>'
     """
 
+    # Maximum number of tag names learned by each renderer class
+    max_learned_tags = 512
+
     def __getattr__(self, name):
         """Any attribute access becomes a tag generation.
 
+        The tag names are learned by the renderer classes not redefining this
+        method: a ``TagProp`` is installed so the next accesses don't go through it.
+
         In:
           - ``name`` -- name of the tag to generate
 
         Return:
           - the generated tag
         """
+        cls = self.__class__
+
+        if (cls.__getattr__ is Renderer.__getattr__) and not name.startswith('_'):
+            nb = cls.__dict__.get('_nb_learned_tags', 0)
+            if (nb < self.max_learned_tags) and (name not in cls.__dict__):
+                cls._nb_learned_tags = nb + 1
+                setattr(cls, name, _LearnedTagProp(name, cls))
+
         return self.makeelement(name)
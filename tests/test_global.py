@@ -155,10 +155,14 @@ def test_global6():
 
     root.findmeld('tr').replace(children)
 
-    root.tostring(xml_declaration=True, pretty_print=True, pipeline=False)
+    data = root.tostring(xml_declaration=True, pretty_print=True, pipeline=False)
+    assert b'meld:id' not in data
+    assert b'xmlns:meld' in data
 
+    # The tree is not changed
     assert root.findmeld('tr') is None
-    assert root.findmeld('content_well') is None
+    assert root.findmeld('content_well') is not None
+    assert b'meld:id="content_well"' in root.tostring()
 
 
 def test_global7():
@@ -213,3 +217,88 @@ def test_global8():
     assert [elt.text for elt in x.root.xpath('.//td')] == ['Girls', 'Pretty', 'Boys', 'Ugly']
     assert x.root[0][1].text == 'My document'
     assert x.root.xpath('.//form')[0].attrib['action'] == './handler'
+
+
+def test_iter_tostring1():
+    """Serialization by chunks of a parsed tree."""
+    x = xml.Renderer()
+    root = x.fromstring(xml_test2_in)
+
+    for kw in (
+        {},
+        {'method': 'html'},
+        {'encoding': 'iso-8859-1'},
+        {'encoding': None},
+        {'encoding': None, 'xml_declaration': True},
+        {'xml_declaration': True},
+        {'pretty_print': True},
+    ):
+        xml_to_compare = root.tostring(**kw)
+
+        assert b''.join(root.iter_tostring(**kw)) == xml_to_compare
+        assert b''.join(root.iter_tostring(chunk_size=10, **kw)) == xml_to_compare
+
+        chunks = list(root.iter_tostring(chunk_size=100, **kw))
+        assert len(chunks) > 1
+        assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+    root = x.fromstring('<a>\u00e9t\u00e9</a>')
+    assert root.tostring(encoding=None) == b'<a>&#233;t&#233;</a>'
+    assert b''.join(root.iter_tostring(chunk_size=1, encoding=None)) == b'<a>&#233;t&#233;</a>'
+
+
+def test_iter_tostring2():
+    """Serialization by chunks of a built tree."""
+    x = xml.Renderer()
+
+    with x.table:
+        for i in range(100):
+            with x.tr:
+                x << x.td(i) << x.td('<%d>' % i).meld_id('td') << x.comment('row')
+            x << 'tail'
+
+    xml_to_compare = x.root.tostring(pipeline=False)
+    assert b'ns0:id' not in xml_to_compare
+    assert b''.join(x.root.iter_tostring(chunk_size=10, pipeline=False)) == xml_to_compare
+    assert b''.join(x.root.iter_tostring(chunk_size=10)) == x.root.tostring()
+    assert ''.join(x.root.iter_tostring(chunk_size=10, encoding='unicode')) == x.root.tostring(encoding='unicode')
+
+
+def test_freeze():
+    x = xml.Renderer()
+
+    footer = x.footer(x.a('home', href='/'), 'é', x.br).freeze()
+    assert isinstance(footer, xml.Frozen)
+
+    page = x.page(x.body('before', footer, 'after', footer))
+    assert page.tostring() == (
+        '<page><body>before<footer><a href="/">home</a>é<br/></footer>after'
+        '<footer><a href="/">home</a>é<br/></footer></body></page>'
+    ).encode('utf-8')
+    assert page.tostring(encoding='unicode') == page.tostring().decode('utf-8')
+    assert page.tostring(encoding='utf-16', xml_declaration=False) == page.tostring().decode('utf-8').encode('utf-16')
+    assert b''.join(page.iter_tostring(chunk_size=10)) == page.tostring()
+    assert page.tostring(method='text') == b'beforeafter'
+
+    with x.body:
+        x << 'text' << footer
+
+    assert x.root.tostring() == '<body>text<footer><a href="/">home</a>é<br/></footer></body>'.encode('utf-8')
+
+    html = x.div(x.br).freeze(method='html')
+    assert x.body(html).tostring(method='html') == b'<body><div><br></div></body>'
+
+
+def test_freeze_melds():
+    x = xml.Renderer()
+
+    nav = x.nav(x.a('home').meld_id('home'))
+    page = x.page(x.body(nav.freeze()))
+    assert page.tostring(pipeline=False) == page.tostring() == b'<page><body><nav><a>home</a></nav></body></page>'
+    assert nav.findmeld('home') is not None
+
+    page = x.page(x.body(nav.freeze(pipeline=True)))
+    assert (
+        page.tostring()
+        == ('<page><body><nav><a xmlns:ns0="%s" ns0:id="home">home</a></nav></body></page>' % xml.MELD_NS).encode()
+    )
@@ -7,6 +7,9 @@
 # this distribution.
 # --
 
+import gc
+import copy
+
 from nagare.renderers import xml
 
 xml_test1_in = """
@@ -223,3 +226,202 @@ def test_repeat4():
 
     result = b''.join(line.lstrip() for line in result.splitlines())
     assert x.root.tostring() == result
+
+
+xml_test3_in = """
+    <ul xmlns:meld="http://www.plope.com/software/meld3"><li meld:id="entry">a</li><li meld:id="entry">b</li></ul>
+"""
+
+
+def test_findmelds():
+    x = xml.Renderer()
+
+    root = x.fromstring(xml_test3_in)
+    assert [e.text for e in root.findmelds('entry')] == ['a', 'b']
+    assert root.findmelds('unknown') == []
+
+    root.index_melds()
+    assert [e.text for e in root.findmelds('entry')] == ['a', 'b']
+    assert root.findmelds('unknown') == []
+    assert root.findmeld('unknown', 'test') == 'test'
+
+
+def test_meld_index1():
+    """Index invalidated by the tags methods."""
+    x = xml.Renderer()
+    x.meld_index = True
+
+    root = x.fromstring(xml_test3_in)
+    assert isinstance(root._meld_index, dict)
+    assert len(root.findmelds('entry')) == 2
+
+    root(x.li('c').meld_id('entry'))
+    assert [e.text for e in root.findmelds('entry')] == ['a', 'b', 'c']
+
+    root.findmeld('entry').meld_id('first')
+    assert [e.text for e in root.findmelds('entry')] == ['b', 'c']
+    assert root.findmeld('first').text == 'a'
+
+    root.findmeld('first').replace(x.li('d').meld_id('entry'))
+    assert [e.text for e in root.findmelds('entry')] == ['d', 'b', 'c']
+    assert root.findmeld('first') is None
+
+    root.fill(x.li('e').meld_id('entry'))
+    assert [e.text for e in root.findmelds('entry')] == ['e']
+
+
+def test_meld_index2():
+    """Index invalidated by a repeat."""
+    x = xml.Renderer()
+    x.meld_index = True
+
+    root = x.fromstring(xml_test1_in)
+    for child, value in root.repeat(['test1', 'test2'], childname='child'):
+        assert child.findmeld('child') is None
+        child(value)
+        assert root.findmeld('child') is not None
+
+    assert [child.text for child in root.findmelds('child')] == ['test1', 'test2']
+
+
+def test_meld_index3():
+    """Index of the ``meld:id`` directly changed."""
+    x = xml.Renderer()
+
+    root = x.fromstring(xml_test3_in).index_melds()
+    root[0].set('{%s}id' % xml.MELD_NS, 'first')
+    assert [e.text for e in root.findmelds('entry')] == ['b']
+    assert root.findmeld('first') is None
+
+    root.index_melds()
+    assert root.findmeld('first').text == 'a'
+
+
+def test_meld_index4():
+    """Index of the tags moved out of the tree."""
+    x = xml.Renderer()
+
+    root = x.fromstring(xml_test3_in).index_melds()
+    xml.Renderer().div(root.findmeld('entry'))
+    assert [e.text for e in root.findmelds('entry')] == ['b']
+
+    root.remove(root[0])
+    assert root.findmeld('entry') is None
+
+
+def test_meld_index5():
+    """Index kept per document."""
+    x = xml.Renderer()
+
+    root = x.fromstring(xml_test3_in).index_melds()
+    other = x.ul(x.li('a').meld_id('entry'))
+    other(x.li('b').meld_id('entry'))
+    assert root._meld_index
+
+    ul = x.ul.index_melds()
+    div = x.div(ul)
+    ul(x.li('c').meld_id('entry'))
+    assert ul._meld_index is None
+    assert [e.text for e in ul.findmelds('entry')] == ['c']
+    assert div.findmeld('entry').text == 'c'
+
+    # Index of a tag moved, with its document, into another tree
+    ul = x.ul(x.li)
+    ul.index_melds()
+    x.body(x.div(ul))
+    ul[0](x.span('d').meld_id('entry'))
+    assert [e.text for e in ul.findmelds('entry')] == ['d']
+
+    # The documents of the garbage collected indexed tags are unregistered
+    del root, ul, div
+    gc.collect()
+    x.div.index_melds()
+    assert len(xml._meld_documents) == len(xml._meld_tags) == 1
+
+
+def test_findmeld_quotes():
+    """The ``meld:id`` values are not interpreted as XPath."""
+    x = xml.Renderer()
+    x.namespaces = {'meld': xml.MELD_NS}
+
+    root = x.node(x.child('a').meld_id('a"b'), x.child('b').meld_id("a'b"))
+    assert root.findmeld('a"b').text == 'a'
+    assert root.findmeld("a'b").text == 'b'
+    assert root.findmeld('"] | //*[@meld:id="a') is None
+
+
+def test_repeat5():
+    """Clones copied by batches."""
+    x = xml.Renderer()
+
+    for items in (range(600), list(range(600)), (i for i in range(600))):
+        node = x.fromstring(xml_test1_in)
+        for child, value in node.repeat(items, childname='child'):
+            child(str(value))
+
+        assert [child.text for child in node.findmelds('child')] == [str(i) for i in range(600)]
+        assert all(type(child) is xml.Tag for child in node)
+
+    node = x.fromstring(xml_test1_in)
+    for child, value in node.repeat(range(600), childname='child'):
+        if value == 10:
+            break
+
+    assert len(node.findmelds('child')) == 11
+
+
+def test_pipeline():
+    """The ``meld:id`` attributes are not serialized, without changing the tree."""
+    x = xml.Renderer()
+    root = x.fromstring(
+        '<a xmlns:meld="%s" xmlns:m="%s" meld:id="a">'
+        '<b meld:id="b" title=\' meld:id="t"\'> meld:id="text" &gt;</b><c m:id="c"/>'
+        '<!-- keep meld:id="x" here --><d xmlns:m="urn:other" m:id="keep"/></a>' % (xml.MELD_NS, xml.MELD_NS)
+    )
+
+    expected = (
+        '<a xmlns:meld="%s" xmlns:m="%s">'
+        '<b title=" meld:id=&quot;t&quot;"> meld:id="text" &gt;</b><c/>'
+        '<!-- keep meld:id="x" here --><d xmlns:m="urn:other" m:id="keep"/></a>' % (xml.MELD_NS, xml.MELD_NS)
+    )
+    assert root.tostring(pipeline=False) == expected.encode()
+    assert root.tostring(pipeline=False, encoding='unicode') == expected
+    assert root.tostring(pipeline=False, encoding='utf-16', xml_declaration=False).decode('utf-16') == expected
+    assert b''.join(root.iter_tostring(chunk_size=1, pipeline=False)) == expected.encode()
+
+    assert root.findmeld('b') is not None
+    assert root[1].get('{%s}id' % xml.MELD_NS) == 'c'
+
+    expected = '<b xmlns:meld="%s" title=" meld:id=&quot;t&quot;"> meld:id="text" &gt;</b>' % xml.MELD_NS
+    assert root[0].tostring(pipeline=False) == expected.encode()
+
+    root = x.fromstring(
+        '<a xmlns:meld="%s"><b meld:id="b"><![CDATA[ meld:id="c" >]]></b></a>' % xml.MELD_NS, strip_cdata=False
+    )
+    expected = '<a xmlns:meld="%s"><b><![CDATA[ meld:id="c" >]]></b></a>' % xml.MELD_NS
+    assert root.tostring(pipeline=False) == expected.encode()
+
+    root = x.fromstring('<script meld:id="s" xmlns:meld="%s">var s = \' meld:id="z" >\'</script>' % xml.MELD_NS)
+    expected = '<script xmlns:meld="%s">var s = \' meld:id="z" >\'</script>' % xml.MELD_NS
+    assert root.tostring(method='html', pipeline=False) == expected.encode()
+
+
+def test_pipeline_iter_tostring(monkeypatch):
+    """The streamed serialization only copies the small parts with ``meld:id`` attributes."""
+    x = xml.Renderer()
+    with x.table.meld_id('table'):
+        for i in range(100):
+            with x.tr.meld_id('tr'):
+                x << x.td(i) << x.td(i).meld_id('td')
+
+    copied = []
+    deepcopy = copy.deepcopy
+    monkeypatch.setattr(copy, 'deepcopy', lambda e: copied.append(len(list(e.iter()))) or deepcopy(e))
+
+    expected = x.root.tostring(pipeline=False)
+    assert copied == [301]
+
+    del copied[:]
+    assert b''.join(x.root.iter_tostring(chunk_size=640, pipeline=False)) == expected
+    assert copied == [3] * 100
+    assert x.root.findmeld('td') is not None
@@ -8,6 +8,9 @@
 # --
 
 import os
+import tempfile
+import threading
+import http.server
 
 from lxml import etree
 
@@ -77,3 +80,261 @@ def test_parse_xmlstring5():
     x = xml.Renderer()
     root = x.fromstring('<a>text</a>')
     assert type(root) is xml.Tag
+
+
+def test_templates_cache1():
+    """Parsed strings are copied from the cache."""
+    x = xml.Renderer()
+    cache = x.templates_cache = xml.LRUCache()
+
+    root1 = x.fromstring('<a><b>text</b></a>')
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    root2 = x.fromstring('<a><b>text</b></a>')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert root1 is not root2
+    assert root2.renderer is x
+    assert type(root2) is xml.Tag
+
+    root1[0].text = 'changed'
+    assert root2.tostring() == b'<a><b>text</b></a>'
+    assert x.fromstring('<a><b>text</b></a>').tostring() == b'<a><b>text</b></a>'
+
+    roots = x.fromstring(xml_fragments_1, fragment=True)
+    assert roots[0] == b'leading_text'
+    roots = x.fromstring(xml_fragments_1, fragment=True, no_leading_text=True)
+    assert roots[0].tostring() == b'<fragment1/>text'
+    assert roots[0].renderer is x
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_templates_cache2():
+    """Parsed files are invalidated when changed."""
+    x = xml.Renderer()
+    cache = x.templates_cache = xml.LRUCache()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'template.xml')
+
+        with open(filename, 'w') as f:
+            f.write('<a/>')
+
+        assert x.fromfile(filename).tostring() == b'<a/>'
+        assert x.fromfile(filename).tostring() == b'<a/>'
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        with open(filename, 'w') as f:
+            f.write('<abc/>')
+
+        assert x.fromfile(filename).tostring() == b'<abc/>'
+        assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_templates_cache3():
+    """Least recently used templates are evicted."""
+    x = xml.Renderer()
+    cache = x.templates_cache = xml.LRUCache(2)
+
+    x.fromstring('<a/>')
+    x.fromstring('<b/>')
+    x.fromstring('<a/>')
+    x.fromstring('<c/>')
+    assert len(cache) == 2
+
+    x.fromstring('<a/>')
+    x.fromstring('<b/>')
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_templates_cache4():
+    """The document of the cached templates is kept."""
+    x = xml.Renderer()
+    x.templates_cache = xml.LRUCache()
+
+    template = '<!DOCTYPE a [<!ENTITY e "entity">]><!-- comment --><a>&e;</a>'
+    for _ in range(2):
+        root = x.fromstring(template)
+        tree = root.getroottree()
+        assert tree.docinfo.doctype == '<!DOCTYPE a>'
+        assert tree.docinfo.internalDTD is not None
+        assert root.getprevious().text == ' comment '
+        assert root.tostring() == b'<a>entity</a>'
+        assert root.renderer is x
+
+    opened = []
+
+    def open_(*args, **kw):
+        opened.append(args[0])
+        return open(*args, **kw)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'template.xml')
+        with open(filename, 'w') as f:
+            f.write(template)
+
+        xml.open = open_
+        try:
+            x.fromfile(filename)
+            root = x.fromfile(filename)
+        finally:
+            del xml.open
+
+        assert opened == [filename]
+        assert root.getroottree().docinfo.URL == filename
+        assert x.templates_cache.hits == 2
+
+
+def test_parsers_pool():
+    """Parsers reused by thread."""
+    x = xml.Renderer()
+
+    parser = x._get_parser(xml.Tag, 'utf-8')
+    assert x._get_parser(xml.Tag, 'utf-8') is parser
+    assert x._get_parser(xml.Tag, 'utf-8', remove_comments=True) is not parser
+    assert x._get_parser(xml.Tag, 'iso-8859-1') is not parser
+
+    parsers = []
+    thread = threading.Thread(target=lambda: parsers.append(x._get_parser(xml.Tag, 'utf-8')))
+    thread.start()
+    thread.join()
+    assert parsers[0] is not parser
+
+    x.templates_cache = None
+    assert x.fromstring('<a><!-- comment --></a>', remove_comments=True).tostring() == b'<a/>'
+    assert x.fromstring('<a><!-- comment --></a>').tostring() == b'<a><!-- comment --></a>'
+
+
+def test_fragment_chunks():
+    """Fragments fed chunk by chunk."""
+    x = xml.Renderer()
+    x.templates_cache = None
+    x.fragment_chunk_size = 7
+
+    roots = x.fromstring(xml_fragments_1, fragment=True)
+    assert roots[0] == b'leading_text'
+    assert roots[1].tostring() == b'<fragment1/>text'
+    assert roots[2].tostring() == b'<fragment2/>'
+
+    with tempfile.NamedTemporaryFile('w', suffix='.xml', encoding='utf-8', delete=False) as f:
+        f.write('<a>é</a>' * 100)
+    try:
+        roots = x.fromfile(f.name, fragment=True)
+        assert len(roots) == 100
+        assert roots[99].text == 'é'
+    finally:
+        os.remove(f.name)
+
+    try:
+        x.fromstring('<a><b></a>', fragment=True)
+    except etree.XMLSyntaxError:
+        pass
+    else:
+        raise AssertionError
+
+    # The parser is reset and can be reused
+    assert len(x.fromstring('<a/><b/>', fragment=True)) == 2
+
+
+def test_url_resolver():
+    """Remote templates cached and revalidated."""
+    requests = []
+    template = [b'<a>1</a>']
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            etag = '"%d"' % len(template[0])
+            requests.append(self.headers.get('If-None-Match'))
+
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(template[0])))
+                self.end_headers()
+                self.wfile.write(template[0])
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%d/template.xml' % server.server_port
+
+        x = xml.Renderer()
+        x.templates_cache = xml.LRUCache()
+        x.url_resolver = xml.UrlResolver(ttl=60)
+
+        assert x.fromfile(url).tostring() == b'<a>1</a>'
+        assert x.fromfile(url).tostring() == b'<a>1</a>'
+        assert requests == [None]
+        assert x.templates_cache.hits == 1
+
+        x.url_resolver.ttl = 0
+        assert x.fromfile(url).tostring() == b'<a>1</a>'
+        assert requests == [None, '"8"']
+        assert x.templates_cache.hits == 2
+
+        template[0] = b'<a>22</a>'
+        assert x.fromfile(url).tostring() == b'<a>22</a>'
+        assert requests == [None, '"8"', '"8"']
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_url_resolver_not_modified():
+    """A not modified response without cached content is refetched."""
+    requests = []
+
+    class UrlResolver(xml.UrlResolver):
+        def fetch(self, url, headers):
+            requests.append(headers)
+            return (None, {}) if len(requests) == 1 else (b'<a/>', {})
+
+    resolver = UrlResolver()
+    assert resolver('http://example.com/a.xml')[1] == b'<a/>'
+    assert requests == [{}, {'Cache-Control': 'no-cache'}]
+
+
+def test_url_resolver_base_url():
+    """The relative references of a remote template are resolved against its url."""
+
+    class UrlResolver(xml.UrlResolver):
+        def __call__(self, url):
+            return None, b'<a/>'
+
+    x = xml.Renderer()
+    x.url_resolver = UrlResolver()
+    assert x.fromfile('http://example.com/a.xml').getroottree().docinfo.URL == 'http://example.com/a.xml'
+
+
+def test_disk_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = xml.DiskCache(directory)
+
+        assert cache.get(('a', 1)) is None
+        cache.set(('a', 1), (1.5, b'data', 'text', None))
+        assert ('a', 1) in cache
+        assert xml.DiskCache(directory).get(('a', 1)) == (1.5, b'data', 'text', None)
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        cache.invalidate(('a', 1))
+        assert ('a', 1) not in cache
+        cache.set('b', b'')
+        cache.clear()
+        assert len(cache) == 0
+
+
+def test_disk_cache_write_error():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = xml.DiskCache(directory)
+
+        cache.set('a', object())
+        assert 'a' not in cache
+        assert os.listdir(directory) == []
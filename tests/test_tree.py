@@ -7,6 +7,12 @@
 # this distribution.
 # --
 
+import os
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict
+
 from nagare.renderers import xml
 
 
@@ -23,6 +29,124 @@ def test_flatten():
     assert list(xml.flatten([42, [1, (3, g(3), 4), 2], 10.0], None)) == [42, 1, 3, 0, 1, 2, 4, 2, 10.0]
 
 
+def test_flatten_renderables():
+    class Component(xml.Renderable):
+        def __init__(self, result):
+            self.result = result
+
+        def render(self, renderer):
+            return self.result
+
+    x = xml.Renderer()
+    tag = x.node
+    inner = Component('inner')
+
+    assert list(xml.flatten([Component([1, Component(2), (3,)]), 'a', tag], x)) == [1, 2, 3, 'a', tag]
+    assert list(xml.flatten([Component(inner)], x)) == [inner]
+    assert list(xml.flatten([Component('abc'), b'def', {'a': 1}], x)) == ['abc', b'def', {'a': 1}]
+
+
+def test_fragments_cache():
+    renders = []
+
+    class Footer(xml.Renderable):
+        def __init__(self, year, cached=True):
+            self.year = year
+            self.cache_key = ('footer', year) if cached else None
+
+        def render(self, renderer):
+            renders.append(self.year)
+            return ['Copyright ', renderer.span(self.year), renderer.a('home', href='/')]
+
+    x = xml.Renderer()
+    x.fragments_cache = xml.LRUCache()
+
+    page1 = x.div(Footer(2025))
+    page1[0].text = 'changed'
+    page2 = x.div(Footer(2025))
+    assert page2.tostring() == b'<div>Copyright <span>2025</span><a href="/">home</a></div>'
+    assert page2[0].renderer is x
+    assert renders == [2025]
+    assert (x.fragments_cache.hits, x.fragments_cache.misses) == (1, 1)
+
+    x.div(Footer(2026))
+    x.div(Footer(2026, cached=False))
+    assert renders == [2025, 2026, 2026]
+
+    x.invalidate_fragment(('footer', 2025))
+    x.div(Footer(2025))
+    assert renders == [2025, 2026, 2026, 2025]
+
+    # Not shared with a renderer with other namespaces
+    ns = xml.Renderer()
+    ns.namespaces = {'x': 'http://example.com/x'}
+    ns.default_namespace = 'x'
+    ns.fragments_cache = x.fragments_cache
+    assert ns.section(Footer(2025))[0].tag == '{http://example.com/x}span'
+    assert renders == [2025, 2026, 2026, 2025, 2025]
+
+    x.fragments_cache = None
+    x.div(Footer(2025))
+    assert renders == [2025, 2026, 2026, 2025, 2025, 2025]
+
+
+def test_invalidate_fragment():
+    renders = []
+
+    class Footer(xml.Renderable):
+        cache_key = 'footer'
+
+        def render(self, renderer):
+            renders.append(type(renderer))
+            return renderer.span('footer')
+
+    class OtherRenderer(xml.Renderer):
+        pass
+
+    cache = xml.LRUCache()
+    x = xml.Renderer()
+    x.fragments_cache = cache
+    other = OtherRenderer()
+    other.fragments_cache = cache
+
+    for _ in range(2):
+        x.div(Footer())
+        other.div(Footer())
+    assert renders == [xml.Renderer, OtherRenderer]
+    assert len(cache) == 2
+
+    x.invalidate_fragment('footer')
+    assert len(cache) == 0
+
+    x.div(Footer())
+    other.div(Footer())
+    assert renders == [xml.Renderer, OtherRenderer, xml.Renderer, OtherRenderer]
+
+
+def test_flatten_deep():
+    children = 'leaf'
+    for _ in range(10000):
+        children = [children]
+
+    assert list(xml.flatten(children, None)) == ['leaf']
+
+
+def test_flatten_close():
+    closed = []
+
+    def g():
+        try:
+            yield 1
+            yield 2
+        finally:
+            closed.append(True)
+
+    flattened = xml.flatten([[g()]], None)
+    assert next(flattened) == 1
+    flattened.close()
+    assert closed == [True]
+
+
 def test_root1():
     x = xml.Renderer()
 
@@ -113,6 +237,31 @@ def test_append4():
     assert node.tostring() == b'<node>test1<child/>test2</node>'
 
 
+def test_append5():
+    """Append text to node with several node children."""
+    x = xml.Renderer()
+
+    node = x.node(x.child1(), x.child2())
+    node('test')
+    assert node.getchildren()[0].tail is None
+    assert node.getchildren()[1].tail == 'test'
+    assert node.tostring() == b'<node><child1/><child2/>test</node>'
+
+
+def test_append6():
+    """Append many texts around node children."""
+    x = xml.Renderer()
+
+    node = x.node('a', 'b', x.child1(), 1, 'c', [x.child2(), b'd', 'e'], True)
+    node('f', 'g')
+    assert node.tostring() == b'<node>ab<child1/>1c<child2/>detruefg</node>'
+
+    with x.node:
+        for i in range(1000):
+            x << str(i)
+    assert x.root.text == ''.join(str(i) for i in range(1000))
+
+
 def test_add_children():
     x = xml.Renderer()
 
@@ -192,6 +341,14 @@ def test_add_children():
     foo.add_children([{'a': 2**40 - 1}])
     assert foo.tostring() == b'<foo a="1099511627775"/>'
 
+    foo = x.foo
+    foo.add_children([True, b'bytes', float('nan'), {'a': True, 'b': b'bytes', 'c': float('inf')}])
+    assert foo.tostring() == b'<foo a="true" b="bytes" c="INF">truebytesNaN</foo>'
+
+    foo = x.foo
+    foo.add_children([x.comment('comment'), x.processing_instruction('target', 'text'), 'tail'])
+    assert foo.tostring() == b'<foo><!--comment--><?target text?>tail</foo>'
+
 
 def test_call():
     x = xml.Renderer()
@@ -370,3 +527,380 @@ def test_with():
         with x.bar:
             x << 'bar'
     assert x.root.tostring() == b'<foo b="42">hello<bar a="10"/>world<bar>bar</bar></foo>'
+
+
+def test_async_children():
+    x = xml.Renderer()
+    order = []
+
+    async def fetch(name, delay):
+        await asyncio.sleep(delay)
+        order.append(name)
+        return x.item(name)
+
+    async def items(n):
+        for i in range(n):
+            yield i
+            yield fetch('async%d' % i, 0)
+
+    async def render():
+        async with x.page:
+            x << 'hello' << fetch('first', 0.02) << [fetch('second', 0.01), ['world']]
+            async with x.list:
+                x << items(2)
+
+        return await x.foo.acall(fetch('called', 0), a=42)
+
+    foo = asyncio.run(render())
+
+    # Concurrent resolution of the siblings
+    assert order.index('second') < order.index('first')
+    assert x.root.tostring() == (
+        b'<page>hello<item>first</item><item>second</item>world'
+        b'<list>0<item>async0</item>1<item>async1</item></list></page>'
+    )
+    assert foo.tostring() == b'<foo a="42"><item>called</item></foo>'
+
+
+def test_aiter_tostring():
+    x = xml.Renderer()
+    root = x.table([x.tr(x.td(i), x.td('cell')) for i in range(100)])
+
+    async def serialize():
+        return [chunk async for chunk in root.aiter_tostring(chunk_size=100)]
+
+    chunks = asyncio.run(serialize())
+    assert len(chunks) > 1
+    assert b''.join(chunks) == root.tostring()
+
+
+def test_threads():
+    """Tags created and melds searched concurrently."""
+    results = []
+
+    def render(i):
+        x = xml.Renderer()
+        x.namespaces = {'meld': xml.MELD_NS}
+
+        for _ in range(50):
+            root = x.node([x.child(i, j).meld_id('child%d' % j) for j in range(10)], 'text', True)
+            results.append(root.findmeld('child5').text == '%d5' % i and root.tostring().endswith(b'texttrue</node>'))
+
+    threads = [threading.Thread(target=render, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 400
+    assert all(results)
+    assert xml.local_parser(xml.Renderer._parser) is xml.local_parser(xml.Renderer._parser)
+    assert xml.local_parser(xml.Renderer._parser) is not xml.Renderer._parser
+
+
+def test_generate_id():
+    x = xml.Renderer()
+    ids = {x.generate_id('id') for _ in range(10000)}
+    assert len(ids) == 10000
+    assert all(i.startswith('id') for i in ids)
+
+    child = xml.Renderer(x)
+    assert child.id_generator is x.id_generator
+    assert child.id != x.id
+
+    x = xml.Renderer(id_generator=xml.DeterministicIdGenerator())
+    assert x.id == 'renderer_0'
+    assert x.generate_id('cell') == 'cell1'
+    assert xml.Renderer(x).id == 'renderer_2'
+
+    x = xml.Renderer(id_generator=xml.DeterministicIdGenerator())
+    assert x.id == 'renderer_0'
+
+    generator = xml.IdGenerator()
+    salt = generator.salt
+    generator.reset()
+    assert generator.salt != salt or generator() == generator.salt + '0'
+    assert generator in xml._id_generators
+
+    assert xml.XmlRenderer.generate_id('id').startswith('id' + xml.XmlRenderer.id_generator.salt)
+
+
+def test_instrumentation():
+    reports = []
+
+    x = xml.Renderer()
+    x.namespaces = {'meld': xml.MELD_NS}
+
+    with x.instrument(reports.append) as stats:
+        with x.ul:
+            for i in range(3):
+                x << x.li(i).meld_id('item%d' % i)
+
+        with xml.Instrumentation() as inner:
+            x.root.findmeld('item1')
+            x.root.findmelds('item2')
+
+        assert inner.meld_lookups == 2
+        data = x.root.tostring()
+        chunks = list(x.root.iter_tostring(chunk_size=10))
+
+    assert reports == [stats]
+    assert stats.elements == 4
+    assert stats.add_children_calls == 4
+    assert stats.add_children_time > 0
+    assert stats.meld_lookups == 2
+    assert stats.serializations == 2
+    assert stats.serialized_bytes == len(data) + len(b''.join(chunks))
+    assert sorted(stats.as_dict()) == [
+        'add_children_calls',
+        'add_children_time',
+        'elements',
+        'meld_lookups',
+        'serialization_time',
+        'serializations',
+        'serialized_bytes',
+    ]
+
+    # Disabled
+    x.root.findmeld('item1')
+    assert stats.meld_lookups == 2
+    assert xml.instrumentation() is None
+
+
+def test_prototypes():
+    x = xml.Renderer()
+    x.namespaces = {'meld': xml.MELD_NS, 'x': 'http://www.w3.org/1999/xhtml'}
+
+    td = x.td('cell', id='1')
+    td.meld_id('cell')
+    assert td.nsmap == x.namespaces
+    assert td.renderer is x
+    assert x.td.tostring() == b'<td xmlns:meld="%s" xmlns:x="http://www.w3.org/1999/xhtml"/>' % xml.MELD_NS.encode()
+
+    x.default_namespace = 'x'
+    assert x.td.tag == '{http://www.w3.org/1999/xhtml}td'
+
+    x.namespaces = None
+    x._prefix = ''
+    assert x.td.tostring() == b'<td/>'
+
+
+def test_learned_tags():
+    class Renderer(xml.Renderer):
+        max_learned_tags = 2
+
+    x = Renderer()
+    assert 'learned1' not in Renderer.__dict__
+
+    assert x.learned1.tag == 'learned1'
+    assert isinstance(Renderer.__dict__['learned1'], xml.TagProp)
+    assert x.learned1.tag == 'learned1'
+    assert x.learned1 is not x.learned1
+
+    x._private
+    assert '_private' not in Renderer.__dict__
+
+    x.learned2
+    x.learned3
+    assert 'learned2' in Renderer.__dict__
+    assert 'learned3' not in Renderer.__dict__
+    assert x.learned3.tag == 'learned3'
+
+    x.learned2 = 42
+    assert x.learned2 == 42
+    assert Renderer().learned2.tag == 'learned2'
+
+    class CustomRenderer(Renderer):
+        def __getattr__(self, name):
+            return self.makeelement('custom-' + name) if name.startswith('learned') else super().__getattr__(name)
+
+    x = CustomRenderer()
+    assert x.learned1.tag == 'custom-learned1'
+    assert x.learned4.tag == 'custom-learned4'
+    assert x.other.tag == 'other'
+    assert not {'learned4', 'other'} & set(CustomRenderer.__dict__)
+
+
+def test_check_attributes():
+    xml.CHECK_ATTRIBUTES = True
+    try:
+
+        class Renderer(xml.XmlRenderer):
+            a = xml.TagProp('a', {'href', 'class'})
+            div = xml.TagProp('div', {'class'})
+            span = xml.TagProp('span')
+
+        x = Renderer()
+        x.a(href='/', class_='link')
+        x.span(foo='bar')
+
+        try:
+            x.a(href='/', foo='bar', title='t')
+        except AttributeError as e:
+            assert str(e) == 'Bad attributes for element <a>: foo, title'
+        else:
+            raise AssertionError
+
+        # Only the added attributes are checked
+        a = x.a
+        a.set('foo', 'bar')
+        a(href='/').meld_id('link')
+
+        try:
+            x.a(OrderedDict(foo='bar'))
+        except AttributeError as e:
+            assert str(e) == 'Bad attributes for element <a>: foo'
+        else:
+            raise AssertionError
+
+        Renderer.attributes_check = 'deferred'
+        x = Renderer()
+        root = x.div(x.a('link', foo='bar'), class_='links')
+        try:
+            root.tostring()
+        except AttributeError as e:
+            assert str(e) == 'Bad attributes for element <a>: foo'
+        else:
+            raise AssertionError
+
+        try:
+            list(root.iter_tostring())
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError
+
+        del root[0].attrib['foo']
+        assert root.tostring() == b'<div class="links"><a>link</a></div>'
+
+        # The parsed tags are not checked
+        assert x.fromstring('<div foo="1"/>').tostring() == b'<div foo="1"/>'
+        assert x.div(x.fromstring('<a foo="1"/>')).tostring() == b'<div><a foo="1"/></div>'
+
+        Renderer.attributes_check_rate = 0
+        x = Renderer()
+        assert x.div(x.a(foo='bar')).tostring() == b'<div><a foo="bar"/></div>'
+    finally:
+        xml.CHECK_ATTRIBUTES = False
+
+
+XSLT = b"""<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:param name="title"/>
+  <xsl:param name="count" select="0"/>
+  <xsl:param name="flag" select="false()"/>
+  <xsl:template match="/list">
+    <ul title="{$title}" count="{$count}">
+      <xsl:if test="$flag"><xsl:attribute name="flag">yes</xsl:attribute></xsl:if>
+      <xsl:for-each select="item"><li><xsl:value-of select="."/></li></xsl:for-each>
+    </ul>
+  </xsl:template>
+</xsl:stylesheet>"""
+
+
+def test_transform():
+    x = xml.Renderer()
+    x.stylesheets_cache = xml.LRUCache()
+
+    root = x.page(x.list(x.item('a'), x.item('b')))
+    ul = root[0].transform(XSLT, title="it's", count=2)
+    assert ul.tostring() == b"""<ul title="it's" count="2"><li>a</li><li>b</li></ul>"""
+    assert isinstance(ul, xml.Tag) and ul.renderer is x
+    assert root.tostring() == b'<page><list><item>a</item><item>b</item></list></page>'
+
+    assert root[0].transform(XSLT, flag=True).get('flag') == 'yes'
+    assert root[0].transform(XSLT, flag=False).get('flag') is None
+    assert root[0].transform(XSLT, count=1.5).get('count') == '1.5'
+    assert root[0].transform(XSLT, count=xml.etree.XPath('count(/list/item)')).get('count') == '2'
+    try:
+        root[0].transform(XSLT, count=None)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError
+
+    assert (x.stylesheets_cache.hits, x.stylesheets_cache.misses) == (4, 1)
+    assert x.xslt(XSLT) is x.xslt(XSLT)
+    assert root.transform(XSLT) is None
+
+    xslts = []
+    thread = threading.Thread(target=lambda: xslts.append(x.xslt(XSLT)))
+    thread.start()
+    thread.join()
+    assert xslts[0] is not x.xslt(XSLT)
+
+    stylesheet = xml.etree.fromstring(XSLT)
+    assert x.xslt(stylesheet) is x.xslt(stylesheet)
+
+    ul = x.list(x.item('c')).transform('\n' + XSLT.decode())
+    assert ul.tostring() == b'<ul title="" count="0"><li>c</li></ul>'
+    assert x.stylesheets_cache.misses == 3
+
+    stylesheet = '<?xml version="1.0" encoding="ISO-8859-1"?>\n' + XSLT.decode().replace('<ul', '<ul lang="\u00e9"')
+    ul = x.list(x.item('c')).transform(stylesheet)
+    assert ul.get('lang') == '\u00e9'
+
+    with tempfile.NamedTemporaryFile('wb', suffix='.xsl', delete=False) as f:
+        f.write(XSLT)
+    try:
+        assert x.list(x.item('c')).transform(f.name).tostring() == b'<ul title="" count="0"><li>c</li></ul>'
+        assert x.stylesheets_cache.misses == 5
+    finally:
+        os.remove(f.name)
+
+
+XSD = b"""<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="item" type="xs:string"/>
+  <xs:element name="list">
+    <xs:complexType><xs:sequence><xs:element ref="item" maxOccurs="unbounded"/></xs:sequence></xs:complexType>
+  </xs:element>
+</xs:schema>"""
+
+RELAXNG = b"""<element name="item" xmlns="http://relaxng.org/ns/structure/1.0"><text/></element>"""
+
+
+def test_validate():
+    x = xml.Renderer()
+    x.schemas_cache = xml.LRUCache()
+
+    def is_invalid(tag, *args, **kw):
+        try:
+            tag.validate(*args, **kw)
+        except xml.etree.DocumentInvalid:
+            return True
+        else:
+            return False
+
+    root = x.page(x.list(x.item('a').meld_id('a'), x.item('b')), x.list(x.item('c')))
+    assert root[0].validate(XSD)
+    assert root.validate(XSD, path='list')
+    assert (x.schemas_cache.hits, x.schemas_cache.misses) == (1, 1)
+    assert root[0][0].get(xml._MELD_ID) == 'a'
+
+    assert is_invalid(root, XSD)
+
+    root[1].append(x.value('d'))
+    assert is_invalid(root, XSD, path='list')
+
+    assert root.validate(RELAXNG, path='.//item[1]')
+    assert x.schemas_cache.misses == 2
+    assert is_invalid(root, RELAXNG, path='list/*')
+
+    assert not root.validate(XSD, rate=0)
+    x.validation_rate = 0
+    assert not root.validate(XSD)
+    assert root[0].validate(xml.etree.XMLSchema(xml.etree.fromstring(XSD)), rate=1)
+    assert root[0].validate(XSD.decode(), rate=1)
+    assert x.schemas_cache.hits == 5
+
+    declaration = '<?xml version="1.0" encoding="UTF-8"?>\n'
+    assert root[0].validate(declaration + XSD.decode(), rate=1)
+    assert root.validate(declaration + RELAXNG.decode(), path='.//item[1]', rate=1)
+    assert x.schemas_cache.misses == 4
+
+    for kw in ({'kind': 'dtd'}, {'path': 'list/item/text()'}, {'path': 'list/item/@meld:id'}, {'path': 'count(list)'}):
+        try:
+            root.validate(XSD, rate=1, **kw)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError